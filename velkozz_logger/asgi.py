@@ -0,0 +1,8 @@
+# Importing ASGI App Compiler:
+from velkozz_logger.asgi import init_asgi_app
+
+app = init_asgi_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5000)
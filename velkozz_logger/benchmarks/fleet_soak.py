@@ -0,0 +1,347 @@
+"""Load generator and soak test emulating a fleet of velkozz microservices.
+
+Each emulated microservice posts python logs to the ingest API at its own rate, encoded as
+logging.handlers.HTTPHandler encodes them with the (app_name, process_type, status_code)
+args the ingest API parses. Services alternate between a base rate and bursts, and draw
+their log levels from a configurable mix.
+
+Every sample interval the soak test appends a row to a CSV file with:
+
+    - The number of logs posted, stored, not stored (202) and failed, and the post latency.
+    - The ingest lag: the time from posting a probe log to it being returned by the daily
+      log API, which includes any batching done by the shared log writer.
+    - The latency of the home page and of the daily dashboard of the first service.
+    - The resident memory of the server process and its children (linux only).
+
+Example of a four hour soak of 50 services against a local deployment:
+
+    python benchmarks/fleet_soak.py --serve "python wsgi.py" --base-url http://localhost:5000 \\
+        --services 50 --rate 2 --burst-every 600 --burst-seconds 60 --burst-factor 20 \\
+        --levels INFO=0.85,WARNING=0.1,ERROR=0.04,CRITICAL=0.01 --duration 14400 --csv soak.csv
+"""
+# Importing native python modules:
+import os
+import csv
+import time
+import random
+import shlex
+import string
+import signal
+import logging
+import argparse
+import datetime
+import threading
+import statistics
+import subprocess
+import http.client
+import urllib.parse
+
+from ingest_throughput import INGEST_PATH, encode_log_record
+from ingest_scaling import LOGGER_DIR, wait_for_port
+
+PROBE_APP_NAME = "velkozz_soak_probe"
+
+# Log msg templates of each level, w/ the funcName and lineno they are logged from:
+LOG_TEMPLATES = {
+    logging.INFO: [
+        ("ingest_posts", 88, lambda rng: f"Ingested {rng.randint(1, 500)} posts from r/{rng.choice(['wallstreetbets', 'stocks', 'investing'])}"),
+        ("write_to_db", 132, lambda rng: f"Wrote {rng.randint(1, 5000)} rows to the database in {rng.uniform(0.01, 3):.2f} seconds"),
+        ("schedule", 41, lambda rng: f"Next pipeline run scheduled in {rng.randint(60, 3600)} seconds")
+    ],
+    logging.WARNING: [
+        ("fetch_page", 57, lambda rng: f"Request to page {rng.randint(1, 50)} returned status 429, retrying in {rng.randint(1, 30)} seconds"),
+        ("write_to_db", 140, lambda rng: f"Skipped {rng.randint(1, 20)} duplicate rows")
+    ],
+    logging.ERROR: [
+        ("fetch_page", 63, lambda rng: f"Request to page {rng.randint(1, 50)} failed after {rng.randint(3, 5)} retries"),
+        ("parse_response", 102, lambda rng: f"Unable to parse response, missing field 'data' at offset {rng.randint(0, 9000)}")
+    ],
+    logging.CRITICAL: [
+        ("write_to_db", 151, lambda rng: f"Database connection lost after {rng.randint(1, 600)} seconds, pipeline halted")
+    ]
+}
+
+# The status_code logged w/ each level:
+LEVEL_STATUS_CODES = {logging.INFO: 200, logging.WARNING: 429, logging.ERROR: 500, logging.CRITICAL: 503}
+
+CSV_COLUMNS = [
+    "timestamp", "elapsed_s", "bursting_services", "posted", "stored", "not_stored", "errors",
+    "error_rate", "post_p50_ms", "post_p99_ms", "ingest_lag_ms", "home_ms", "dashboard_ms", "rss_mb"
+]
+
+def parse_level_mix(level_mix):
+    "Method that parses a level mix such as 'INFO=0.9,ERROR=0.1' into lists of levels and weights"
+    levels, weights = [], []
+    for level_weight in level_mix.split(","):
+        level_name, weight = level_weight.split("=")
+        levels.append(logging.getLevelName(level_name.strip().upper()))
+        weights.append(float(weight))
+
+    if not all(level in LOG_TEMPLATES for level in levels):
+        raise ValueError(f"Levels must be one of {[logging.getLevelName(level) for level in LOG_TEMPLATES]}")
+
+    return levels, weights
+
+def process_tree_rss_kb(pid):
+    "Method that sums the VmRSS of a process and all of its descendants from /proc, None if it has exited"
+    total, pids = 0, [pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                total += next((int(line.split()[1]) for line in status if line.startswith("VmRSS:")), 0)
+            for task in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{task}/children") as children:
+                    pids.extend(int(child) for child in children.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            if not total:
+                return None
+
+    return total
+
+class FleetStats(object):
+    "The counters of the posts made by the fleet, swapped out at every sample"
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.posted, self.stored, self.not_stored, self.errors = 0, 0, 0, 0
+        self.latencies = []
+
+    def record(self, status, latency):
+        with self._lock:
+            self.posted += 1
+            self.latencies.append(latency)
+            if status is None or status >= 400:
+                self.errors += 1
+            elif status == 202:
+                self.not_stored += 1
+            else:
+                self.stored += 1
+
+    def take(self):
+        "Method that returns the counters since the last sample and resets them"
+        with self._lock:
+            sample = {
+                "posted": self.posted, "stored": self.stored, "not_stored": self.not_stored,
+                "errors": self.errors, "latencies": sorted(self.latencies)
+            }
+            self.reset()
+
+        return sample
+
+class BurstSchedule(object):
+    """The schedule of the bursts of the fleet.
+
+    Every 'burst_every' seconds a random 'burst_fraction' of the services post at
+    'burst_factor' times their base rate for 'burst_seconds'.
+    """
+    def __init__(self, services, burst_every, burst_seconds, burst_factor, burst_fraction, seed, start):
+        self.services = services
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self.burst_factor = burst_factor
+        self.burst_fraction = burst_fraction
+        self.seed = seed
+        self.start = start
+
+    def bursting(self, now):
+        "Method that returns the indexes of the services bursting at 'now'"
+        if not self.burst_every:
+            return set()
+
+        window, offset = divmod(now - self.start, self.burst_every)
+        if offset >= self.burst_seconds:
+            return set()
+
+        rng = random.Random(self.seed * 100003 + int(window))
+        return set(rng.sample(range(self.services), max(1, round(self.services * self.burst_fraction))))
+
+    def rate_multiplier(self, service_index, now):
+        return self.burst_factor if service_index in self.bursting(now) else 1.0
+
+def post(connection, payload):
+    "Method that posts a log over a keep-alive connection, returning the status or None on connection errors"
+    headers = {"Content-type": "application/x-www-form-urlencoded"}
+    try:
+        connection.request("POST", INGEST_PATH, payload, headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except (OSError, http.client.HTTPException):
+        connection.close()
+        return None
+
+def run_service(base_url, service_index, app_name, rate, schedule, levels, weights, stats, stop, seed):
+    """Method that emulates a single microservice posting logs until 'stop' is set.
+
+    Like a real service using HTTPHandler the logs are posted one at a time, so the rate a
+    service achieves is capped by the post latency of the deployment.
+    """
+    url = urllib.parse.urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    rng = random.Random(seed)
+
+    while not stop.is_set():
+        # Waiting for the next log of a poisson process at the current rate:
+        stop.wait(rng.expovariate(rate * schedule.rate_multiplier(service_index, time.time())))
+        if stop.is_set():
+            break
+
+        level = rng.choices(levels, weights)[0]
+        func, lineno, build_msg = rng.choice(LOG_TEMPLATES[level])
+        payload = encode_log_record(
+            app_name, level, build_msg(rng), "soak_test", LEVEL_STATUS_CODES[level], func, lineno)
+
+        start = time.perf_counter()
+        status = post(connection, payload)
+        stats.record(status, time.perf_counter() - start)
+
+    connection.close()
+
+def get(base_url, path, timeout=60):
+    "Method that makes a GET request on a new connection, returning the status, body and latency"
+    url = urllib.parse.urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    start = time.perf_counter()
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, body, time.perf_counter() - start
+    except (OSError, http.client.HTTPException):
+        return None, b"", time.perf_counter() - start
+    finally:
+        connection.close()
+
+def measure_ingest_lag(base_url, timeout):
+    """Method that posts a probe log and polls the daily log API until it is returned.
+
+    The probe msg is a random run of letters so it is never masked out of the msg template
+    and collapsed into an earlier probe. Returns the lag in seconds, or None if the probe was
+    not stored or not returned within 'timeout'.
+    """
+    marker = "".join(random.choices(string.ascii_lowercase, k=16))
+    url = urllib.parse.urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    payload = encode_log_record(
+        PROBE_APP_NAME, logging.INFO, f"Soak probe {marker}", "soak_probe", 200, "measure_ingest_lag", 1)
+
+    start = time.perf_counter()
+    status = post(connection, payload)
+    connection.close()
+    if status != 200:
+        return None
+
+    path = f"/microservices/api/{PROBE_APP_NAME}/{datetime.date.today().strftime('%d-%m-%Y')}/?limit=1&q={marker}"
+    while time.perf_counter() - start < timeout:
+        status, body, _ = get(base_url, path)
+        if status == 200 and marker.encode() in body:
+            return time.perf_counter() - start
+        time.sleep(0.05)
+
+    return None
+
+def percentile_ms(latencies, fraction):
+    return latencies[max(int(len(latencies) * fraction) - 1, 0)] * 1000 if latencies else None
+
+def soak(args, server_pid):
+    "Method that runs the fleet against the deployment, writing a CSV row every sample interval"
+    levels, weights = parse_level_mix(args.levels)
+    rng = random.Random(args.seed)
+    start = time.time()
+    schedule = BurstSchedule(
+        args.services, args.burst_every, args.burst_seconds, args.burst_factor, args.burst_fraction, args.seed, start)
+
+    stats, stop = FleetStats(), threading.Event()
+    app_names = [f"soak_service_{index}" for index in range(args.services)]
+    threads = [
+        threading.Thread(
+            target=run_service, daemon=True,
+            args=(args.base_url, index, app_name, args.rate * rng.lognormvariate(0, args.rate_spread),
+                  schedule, levels, weights, stats, stop, args.seed + index + 1))
+        for index, app_name in enumerate(app_names)
+    ]
+    for thread in threads:
+        thread.start()
+
+    dashboard_path = f"/microservices/dashboard/{app_names[0]}/{datetime.date.today().strftime('%d-%m-%Y')}/"
+
+    with open(args.csv, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+
+        try:
+            while time.time() - start < args.duration:
+                time.sleep(min(args.sample_seconds, max(args.duration - (time.time() - start), 0)))
+
+                lag = measure_ingest_lag(args.base_url, args.lag_timeout)
+                _, _, home_latency = get(args.base_url, "/microservices/")
+                _, _, dashboard_latency = get(args.base_url, dashboard_path)
+                rss_kb = process_tree_rss_kb(server_pid) if server_pid else None
+                sample = stats.take()
+
+                row = {
+                    "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "elapsed_s": round(time.time() - start),
+                    "bursting_services": len(schedule.bursting(time.time())),
+                    "posted": sample["posted"],
+                    "stored": sample["stored"],
+                    "not_stored": sample["not_stored"],
+                    "errors": sample["errors"],
+                    "error_rate": round(sample["errors"] / sample["posted"], 4) if sample["posted"] else 0,
+                    "post_p50_ms": round(statistics.median(sample["latencies"]) * 1000, 2) if sample["latencies"] else None,
+                    "post_p99_ms": round(percentile_ms(sample["latencies"], 0.99), 2) if sample["latencies"] else None,
+                    "ingest_lag_ms": round(lag * 1000, 2) if lag is not None else None,
+                    "home_ms": round(home_latency * 1000, 2),
+                    "dashboard_ms": round(dashboard_latency * 1000, 2),
+                    "rss_mb": round(rss_kb / 1024, 1) if rss_kb else None
+                }
+                writer.writerow(row)
+                csv_file.flush()
+
+                print(
+                    f"{row['elapsed_s']:>8}s posted={row['posted']} errors={row['errors']} "
+                    f"lag_ms={row['ingest_lag_ms']} home_ms={row['home_ms']} rss_mb={row['rss_mb']}")
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5000", help="Base url of the deployment")
+    parser.add_argument("--serve", help="Command started from the velkozz_logger directory to serve the deployment")
+    parser.add_argument("--pid", type=int, help="Pid of an already running server to track the memory of")
+    parser.add_argument("--services", type=int, default=20, help="Number of emulated microservices")
+    parser.add_argument("--rate", type=float, default=1.0, help="Mean logs per second of each service")
+    parser.add_argument("--rate-spread", type=float, default=0.5, help="Sigma of the lognormal spread of the service rates")
+    parser.add_argument("--levels", default="INFO=0.85,WARNING=0.1,ERROR=0.04,CRITICAL=0.01", help="Weights of each log level")
+    parser.add_argument("--burst-every", type=float, default=0, help="Seconds between bursts, 0 disables bursts")
+    parser.add_argument("--burst-seconds", type=float, default=30, help="Duration of each burst")
+    parser.add_argument("--burst-factor", type=float, default=10, help="Rate multiplier of the bursting services")
+    parser.add_argument("--burst-fraction", type=float, default=0.1, help="Fraction of the services bursting at once")
+    parser.add_argument("--duration", type=float, default=3600, help="Duration of the soak in seconds")
+    parser.add_argument("--sample-seconds", type=float, default=30, help="Interval between CSV rows")
+    parser.add_argument("--lag-timeout", type=float, default=60, help="Seconds to wait for a probe log to be returned")
+    parser.add_argument("--csv", default="fleet_soak.csv", help="Path of the CSV file written")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    if args.serve:
+        server = subprocess.Popen(
+            shlex.split(args.serve), cwd=LOGGER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        if server is not None:
+            wait_for_port(urllib.parse.urlsplit(args.base_url).port or 80)
+        soak(args, server.pid if server is not None else args.pid)
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark of the ingest throughput of the sharded deployment as the number of ingest processes grows.
+
+For each process count the benchmark starts ingest_supervisor.py, waits for it to accept
+connections, drives it with the concurrent clients of ingest_throughput.py and stops it.
+
+Example:
+
+    python benchmarks/ingest_scaling.py --processes 1 2 4 8 --clients 64 --requests 500
+"""
+# Importing native python modules:
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import subprocess
+
+from ingest_throughput import benchmark
+
+LOGGER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_for_port(port, timeout=30):
+    "Method that blocks until the supervisor accepts connections on 'port'"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+
+    raise TimeoutError(f"Ingest supervisor did not start listening on port {port}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="Ingest process counts to benchmark")
+    parser.add_argument("--clients", type=int, default=32, help="Number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Requests made by each client")
+    parser.add_argument("--port", type=int, default=5050)
+    args = parser.parse_args()
+
+    print(f"{'processes':>10}{'clients':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for processes in args.processes:
+        supervisor = subprocess.Popen(
+            [sys.executable, "ingest_supervisor.py", "--port", str(args.port), "--processes", str(processes)],
+            cwd=LOGGER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(args.port)
+            result = benchmark(f"http://127.0.0.1:{args.port}", args.clients, args.requests)
+            print(
+                f"{processes:>10}{args.clients:>8}{result['requests']:>10}{result['errors']:>8}"
+                f"{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+        finally:
+            supervisor.send_signal(signal.SIGTERM)
+            supervisor.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark of the concurrent client throughput of the ingest API.
+
+Posts velkozz style python logs to one or more running deployments of the logger and
+reports the throughput and latency of each at increasing numbers of concurrent clients.
+The logs are encoded exactly as logging.handlers.HTTPHandler encodes them.
+
+Example comparing the WSGI and ASGI deployments:
+
+    python wsgi.py                             # Serving on port 5000
+    uvicorn asgi:app --port 8000 --workers 1   # Serving on port 8000
+
+    python benchmarks/ingest_throughput.py \\
+        --target wsgi=http://localhost:5000 --target asgi=http://localhost:8000 \\
+        --clients 1 8 32 64 --requests 500
+"""
+# Importing native python modules:
+import time
+import logging
+import argparse
+import statistics
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+INGEST_PATH = "/microservices/api/"
+
+def encode_log_record(app_name, level, msg, process_type, status_code, func, lineno):
+    "Method that encodes a velkozz log the same way logging.handlers.HTTPHandler does"
+    record = logging.LogRecord(
+        name=app_name,
+        level=level,
+        pathname=__file__,
+        lineno=lineno,
+        msg=msg,
+        args=(app_name, process_type, status_code),
+        exc_info=None,
+        func=func
+    )
+    return urllib.parse.urlencode(record.__dict__)
+
+def build_log_payload(app_name, client_id, request_id):
+    "Method that encodes the log posted by a benchmark client"
+    return encode_log_record(
+        app_name, logging.INFO, f"Benchmark log {request_id} from client {client_id}",
+        "benchmark", 200, "build_log_payload", 42)
+
+def run_client(base_url, client_id, requests):
+    "Method that posts logs sequentially over a single keep-alive connection, returning latencies"
+    url = urllib.parse.urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    headers = {"Content-type": "application/x-www-form-urlencoded"}
+    latencies, errors = [], 0
+
+    for request_id in range(requests):
+        payload = build_log_payload(f"benchmark_client_{client_id}", client_id, request_id)
+        start = time.perf_counter()
+        try:
+            connection.request("POST", INGEST_PATH, payload, headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        latencies.append(time.perf_counter() - start)
+
+    connection.close()
+    return latencies, errors
+
+def benchmark(base_url, clients, requests):
+    "Method that runs 'clients' concurrent clients against a deployment and summarizes the results"
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(
+            lambda client_id: run_client(base_url, client_id, requests), range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", required=True, help="name=base_url of a deployment to benchmark")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32], help="Numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Requests made by each client")
+    args = parser.parse_args()
+
+    print(f"{'target':<12}{'clients':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for target in args.target:
+        name, base_url = target.split("=", 1)
+        for clients in args.clients:
+            result = benchmark(base_url, clients, args.requests)
+            print(
+                f"{name:<12}{clients:>8}{result['requests']:>10}{result['errors']:>8}"
+                f"{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# Importing native python modules:
+import logging
+import argparse
+
+# Importing the Sharded Ingest Supervisor:
+from velkozz_logger.ingest_cluster import IngestSupervisor
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves the logger from N ingest processes sharing a single log writer")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--processes", type=int, default=4, help="Number of ingest processes")
+    parser.add_argument("--writer-address", default="/tmp/velkozz_log_writer.sock", help="Unix socket of the log writer")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Maximum logs per batch insert")
+    parser.add_argument("--batch-seconds", type=float, default=0.5, help="Maximum time a batch waits to fill")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    IngestSupervisor(
+        args.host, args.port, args.processes, args.writer_address, 
+        batch_size=args.batch_size, batch_seconds=args.batch_seconds).run()
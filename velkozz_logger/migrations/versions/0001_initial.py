@@ -0,0 +1,52 @@
+"""Baseline schema created by db.create_all()
+
+Revision ID: 0001_initial
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('microservice-logs',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('msg', sa.Text(), nullable=True),
+        sa.Column('app_name', sa.String(length=100), nullable=True),
+        sa.Column('process_type', sa.String(length=100), nullable=True),
+        sa.Column('status_code', sa.Integer(), nullable=True),
+        sa.Column('levelname', sa.String(length=100), nullable=True),
+        sa.Column('created', sa.TIMESTAMP(), nullable=False),
+        sa.Column('lineno', sa.Integer(), nullable=True),
+        sa.Column('funcName', sa.String(length=100), nullable=True),
+        sa.Column('msecs', sa.Float(), nullable=True),
+        sa.Column('relativeCreated', sa.TIMESTAMP(), nullable=True),
+        sa.Column('thread', sa.Float(), nullable=True),
+        sa.Column('threadName', sa.String(length=100), nullable=True),
+        sa.Column('processName', sa.String(length=100), nullable=True),
+        sa.Column('process', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('created')
+    )
+    op.create_index('ix_microservice-logs_created', 'microservice-logs', ['created'], unique=False)
+
+    op.create_table('microservices',
+        sa.Column('microservice_name', sa.String(length=100), nullable=False),
+        sa.Column('microservice_description', sa.String(length=200), nullable=True),
+        sa.Column('date_added', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('microservice_name'),
+        sa.UniqueConstraint('microservice_name')
+    )
+
+
+def downgrade():
+    op.drop_table('microservices')
+    op.drop_index('ix_microservice-logs_created', table_name='microservice-logs')
+    op.drop_table('microservice-logs')
@@ -0,0 +1,60 @@
+"""Duplicate collapsing columns and the heartbeat, drop rollup and summary tables
+
+Revision ID: 0002_ingest_state
+Revises: 0001_initial
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_ingest_state'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable columns and a constant server default only change the catalog, the log table is not rewritten:
+    op.add_column('microservice-logs', sa.Column('fingerprint', sa.String(length=40), nullable=True))
+    op.add_column('microservice-logs', sa.Column('last_seen', sa.TIMESTAMP(), nullable=True))
+    op.add_column('microservice-logs', sa.Column('occurrences', sa.Integer(), server_default='1', nullable=False))
+
+    op.create_table('microservice-heartbeats',
+        sa.Column('app_name', sa.String(length=100), nullable=False),
+        sa.Column('levelname', sa.String(length=100), nullable=False),
+        sa.Column('last_seen', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('app_name', 'levelname')
+    )
+
+    op.create_table('microservice-log-drops',
+        sa.Column('app_name', sa.String(length=100), nullable=False),
+        sa.Column('levelname', sa.String(length=100), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('dropped', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('app_name', 'levelname', 'date')
+    )
+
+    op.create_table('microservice-summaries',
+        sa.Column('app_name', sa.String(length=100), nullable=False),
+        sa.Column('info_count', sa.Integer(), nullable=False),
+        sa.Column('warning_count', sa.Integer(), nullable=False),
+        sa.Column('error_count', sa.Integer(), nullable=False),
+        sa.Column('critical_count', sa.Integer(), nullable=False),
+        sa.Column('error_ratio', sa.Float(), nullable=False),
+        sa.Column('last_seen', sa.TIMESTAMP(), nullable=True),
+        sa.Column('daily_counts', sa.Text(), nullable=False),
+        sa.Column('refreshed_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('app_name')
+    )
+
+
+def downgrade():
+    op.drop_table('microservice-summaries')
+    op.drop_table('microservice-log-drops')
+    op.drop_table('microservice-heartbeats')
+    op.drop_column('microservice-logs', 'occurrences')
+    op.drop_column('microservice-logs', 'last_seen')
+    op.drop_column('microservice-logs', 'fingerprint')
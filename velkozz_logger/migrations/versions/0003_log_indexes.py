@@ -0,0 +1,35 @@
+"""Concurrently built indexes on the log table
+
+Revision ID: 0003_log_indexes
+Revises: 0002_ingest_state
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_log_indexes'
+down_revision = '0002_ingest_state'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction and does not block inserts:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_microservice-logs_app_name_created', 'microservice-logs', ['app_name', 'created'],
+            unique=False, postgresql_concurrently=True)
+        op.create_index(
+            'ix_microservice-logs_fingerprint', 'microservice-logs', ['fingerprint'],
+            unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_microservice-logs_fingerprint', table_name='microservice-logs', postgresql_concurrently=True)
+        op.drop_index(
+            'ix_microservice-logs_app_name_created', table_name='microservice-logs', postgresql_concurrently=True)
@@ -0,0 +1,33 @@
+"""Log rate buckets shared by the anomaly detectors of every worker
+
+Revision ID: 0004_log_rates
+Revises: 0003_log_indexes
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_log_rates'
+down_revision = '0003_log_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('microservice-log-rates',
+        sa.Column('app_name', sa.String(length=100), nullable=False),
+        sa.Column('levelname', sa.String(length=100), nullable=False),
+        sa.Column('bucket_start', sa.TIMESTAMP(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('app_name', 'levelname', 'bucket_start')
+    )
+    op.create_index(
+        'ix_microservice-log-rates_bucket_start', 'microservice-log-rates', ['bucket_start'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_microservice-log-rates_bucket_start', table_name='microservice-log-rates')
+    op.drop_table('microservice-log-rates')
@@ -0,0 +1,96 @@
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+from velkozz_logger.microservice_logger.anomaly_detection import LogRateDetector
+
+START = 1_000_000 * 60.0
+
+def bucket(index):
+    return START + index * 60
+
+def steady_counts(buckets, count=10):
+    return {bucket(index): count for index in range(buckets)}
+
+def build_detector():
+    detector = LogRateDetector()
+    detector.bucket_seconds = 60
+    detector.flush_seconds = 10
+    return detector
+
+def test_observe_counts_each_log_against_its_level_and_all_levels():
+    detector = build_detector()
+    detector.observe("app", "ERROR", timestamp=bucket(0) + 5)
+    detector.observe("app", "ERROR", timestamp=bucket(0) + 50)
+    detector.observe("app", "INFO", timestamp=bucket(1) + 5)
+
+    assert detector.take_pending() == {
+        ("app", "ERROR", bucket(0)): 2,
+        ("app", "*", bucket(0)): 2,
+        ("app", "INFO", bucket(1)): 1,
+        ("app", "*", bucket(1)): 1
+    }
+    assert detector.take_pending() == {}
+
+def test_burst_in_a_settled_bucket_is_flagged():
+    detector = build_detector()
+    counts = {**steady_counts(30), bucket(30): 200}
+
+    detector.fold_counts({("app", "*"): counts}, now=bucket(31) + 30)
+    flags = detector.evaluate([], now=bucket(31) + 30)
+
+    assert [(flag.kind, flag.observed, flag.detected_at) for flag in flags] == [("burst", 200, bucket(30))]
+
+def test_burst_in_an_open_bucket_is_flagged_and_updated_as_it_grows():
+    detector = build_detector()
+    detector.fold_counts({("app", "*"): {**steady_counts(30), bucket(30): 100}}, now=bucket(30) + 5)
+    assert [flag.observed for flag in detector.evaluate([], now=bucket(30) + 5)] == [100]
+
+    detector.fold_counts({("app", "*"): {bucket(30): 250}}, now=bucket(31) + 30)
+    assert [flag.observed for flag in detector.evaluate([], now=bucket(31) + 30)] == [250]
+
+def test_counts_below_the_minimum_are_not_bursts():
+    detector = build_detector()
+    counts = {**steady_counts(30, count=1), bucket(30): 15}
+
+    detector.fold_counts({("app", "*"): counts}, now=bucket(31) + 30)
+    assert detector.evaluate([], now=bucket(31) + 30) == []
+
+def test_stats_do_not_depend_on_how_often_the_counts_are_folded():
+    counts = {bucket(index): 5 + index % 7 for index in range(40)}
+
+    once = build_detector()
+    once.fold_counts({("app", "*"): counts}, now=bucket(41) + 30)
+
+    incremental = build_detector()
+    for until in (10, 25, 41):
+        now = bucket(until) + 30
+        since = incremental._synced_until if incremental._synced_until is not None else START
+        incremental.fold_counts(
+            {("app", "*"): {start: count for start, count in counts.items() if since <= start <= now}}, now=now)
+
+    once_state, incremental_state = once._series[("app", "*")], incremental._series[("app", "*")]
+    assert incremental_state.buckets_seen == once_state.buckets_seen
+    assert incremental_state.mean == pytest.approx(once_state.mean)
+    assert incremental_state.var == pytest.approx(once_state.var)
+    assert incremental_state.quantile == pytest.approx(once_state.quantile)
+
+def test_silence_is_flagged_after_the_threshold():
+    detector = build_detector()
+    detector.silence_min_seconds = 900
+    detector.fold_counts({("app", "*"): steady_counts(30)}, now=bucket(30))
+    assert detector.evaluate([], now=bucket(30) + 600) == []
+
+    now = bucket(30) + 1000
+    detector.fold_counts({}, now=now)
+    flags = detector.evaluate([], now=now)
+    assert [(flag.kind, flag.app_name, flag.observed) for flag in flags] == [("silence", "app", 1000)]
+
+def test_registered_microservice_that_never_logged_is_silent():
+    detector = build_detector()
+    detector.silence_min_seconds = 900
+    detector._started = bucket(0)
+
+    assert detector.evaluate(["quiet_app"], now=bucket(0) + 600) == []
+    flags = detector.evaluate(["quiet_app"], now=bucket(0) + 1000)
+    assert [(flag.kind, flag.app_name, flag.observed) for flag in flags] == [("silence", "quiet_app", None)]
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+from velkozz_logger.microservice_logger.ingest import build_log_record
+
+def log_args(**fields):
+    args = {
+        "args": "('app', 'tests', 200)", "created": "1700000000.5", "lineno": "1", "msecs": "500.0",
+        "relativeCreated": "10.0", "thread": "1", "name": "app", "msg": "msg", "levelname": "INFO",
+        "funcName": "test", "threadName": "MainThread", "processName": "MainProcess", "process": "1"
+    }
+    args.update(fields)
+    return args
+
+def test_builds_the_record_of_a_log():
+    record = build_log_record(log_args())
+
+    assert (record["app_name"], record["levelname"], record["status_code"]) == ("app", "INFO", 200)
+
+def test_allows_the_optional_fields_to_be_missing():
+    assert build_log_record(log_args(processName=None, process=None))["processName"] is None
+
+def test_rejects_a_missing_levelname():
+    with pytest.raises(Warning):
+        build_log_record(log_args(levelname=None))
+
+@pytest.mark.parametrize("app_name", ["None", "''", repr("a" * 101)])
+def test_rejects_an_app_name_that_does_not_fit_its_column(app_name):
+    with pytest.raises(ValueError):
+        build_log_record(log_args(args=f"({app_name}, 'tests', 200)"))
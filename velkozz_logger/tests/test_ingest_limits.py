@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+from velkozz_logger.microservice_logger.ingest_limits import IngestLimiter, TokenBucket
+
+def test_token_bucket_allows_the_burst_then_refills_at_the_rate():
+    bucket = TokenBucket(rate=2, burst=3, now=0.0)
+
+    assert [bucket.try_take(0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.try_take(0.5)
+    assert not bucket.try_take(0.5)
+
+def test_token_bucket_never_exceeds_its_burst():
+    bucket = TokenBucket(rate=100, burst=2, now=0.0)
+
+    assert [bucket.try_take(60.0) for _ in range(3)] == [True, True, False]
+
+def test_limiter_admits_everything_without_limits():
+    limiter = IngestLimiter()
+
+    assert all(limiter.admit("app", "INFO", "msg") is None for _ in range(1000))
+
+def test_limiter_rate_limits_per_app_name():
+    limiter = IngestLimiter()
+    limiter.rate_limit = (0.001, 2)
+
+    assert [limiter.admit("app", "INFO", f"msg {index}") for index in range(3)] == [
+        None, None, IngestLimiter.RATE_LIMITED]
+    assert limiter.admit("other_app", "INFO", "msg") is None
+
+def test_limiter_splits_the_limits_across_workers():
+    limiter = IngestLimiter()
+    limiter.rate_limit = (0.001, 4)
+    limiter.workers = 2
+
+    assert [limiter.admit("app", "INFO", f"msg {index}") for index in range(3)] == [
+        None, None, IngestLimiter.RATE_LIMITED]
+
+def test_limiter_samples_repeated_msgs():
+    limiter = IngestLimiter()
+    limiter.duplicate_keep = 2
+    limiter.duplicate_sample_rate = 0.0
+
+    assert [limiter.admit("app", "ERROR", "same msg") for _ in range(3)] == [
+        None, None, IngestLimiter.SAMPLED]
+    assert limiter.admit("app", "ERROR", "different msg") is None
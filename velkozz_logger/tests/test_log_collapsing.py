@@ -0,0 +1,104 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+from velkozz_logger.microservice_logger.log_collapsing import (
+    LogCollapser, log_fingerprint, normalize_msg_template)
+
+START = datetime.datetime(2026, 10, 19, 12, 0, 0)
+
+def seconds(offset):
+    return START + datetime.timedelta(seconds=offset)
+
+def test_normalize_msg_template_masks_variable_values():
+    assert normalize_msg_template("Took 12.5s for 'job-a' 0xff") == normalize_msg_template("Took 3s for 'job-b' 0x1")
+    assert normalize_msg_template(None) == ""
+
+def test_fingerprint_depends_on_the_call_site():
+    assert log_fingerprint("app", "ERROR", "run", 10, "failed 1") == log_fingerprint("app", "ERROR", "run", 10, "failed 2")
+    assert log_fingerprint("app", "ERROR", "run", 10, "failed") != log_fingerprint("app", "ERROR", "run", 11, "failed")
+
+def test_repeats_within_the_window_are_absorbed():
+    collapser = LogCollapser()
+    collapser.window_seconds = 60
+
+    assert not collapser.absorb("fp", seconds(0))
+    collapser.track("fp", seconds(0), "app")
+    assert collapser.absorb("fp", seconds(10))
+    assert collapser.absorb("fp", seconds(20))
+
+    assert collapser.take_updates(now=seconds(30)) == [("app", seconds(0), 2, seconds(20))]
+    assert collapser.take_updates(now=seconds(30)) == []
+
+def test_repeat_after_the_window_starts_a_new_row():
+    collapser = LogCollapser()
+    collapser.window_seconds = 60
+
+    collapser.track("fp", seconds(0), "app")
+    assert not collapser.absorb("fp", seconds(61))
+
+def test_pending_occurrences_survive_a_window_rollover():
+    collapser = LogCollapser()
+    collapser.window_seconds = 60
+
+    collapser.track("fp", seconds(0), "app")
+    assert collapser.absorb("fp", seconds(30))
+    assert collapser.absorb("fp", seconds(50))
+
+    # The next repeat is past the window, so it is written as a new row and tracked:
+    assert not collapser.absorb("fp", seconds(70))
+    collapser.track("fp", seconds(70), "app")
+    assert collapser.absorb("fp", seconds(80))
+
+    assert sorted(collapser.take_updates(now=seconds(90))) == [
+        ("app", seconds(0), 2, seconds(50)),
+        ("app", seconds(70), 1, seconds(80))
+    ]
+
+def test_pending_occurrences_survive_an_out_of_order_log():
+    collapser = LogCollapser()
+    collapser.window_seconds = 60
+
+    collapser.track("fp", seconds(10), "app")
+    assert collapser.absorb("fp", seconds(20))
+
+    assert not collapser.absorb("fp", seconds(5))
+    collapser.track("fp", seconds(5), "app")
+
+    assert collapser.take_updates(now=seconds(30)) == [("app", seconds(10), 1, seconds(20))]
+
+def test_closed_groups_are_dropped_once_taken():
+    collapser = LogCollapser()
+    collapser.window_seconds = 60
+
+    collapser.track("fp", seconds(0), "app")
+    collapser.take_updates(now=seconds(120))
+    assert not collapser.absorb("fp", seconds(30))
+
+def test_unmatched_updates_are_retried_until_they_expire():
+    collapser = LogCollapser()
+    collapser.unmatched_seconds = 120
+    update = ("app", seconds(0), 3, seconds(20))
+
+    collapser.retry_unmatched([update], [update], now=0.0)
+    assert collapser.take_updates(now=seconds(30)) == [update]
+
+    collapser.retry_unmatched([update], [update], now=60.0)
+    assert collapser.take_updates(now=seconds(30)) == [update]
+
+    collapser.retry_unmatched([update], [update], now=120.0)
+    assert collapser.take_updates(now=seconds(30)) == []
+
+def test_matched_updates_reset_the_unmatched_deadline():
+    collapser = LogCollapser()
+    collapser.unmatched_seconds = 120
+    update = ("app", seconds(0), 3, seconds(20))
+
+    collapser.retry_unmatched([update], [update], now=0.0)
+    collapser.take_updates(now=seconds(30))
+    collapser.retry_unmatched([update], [], now=60.0)
+    collapser.retry_unmatched([update], [update], now=150.0)
+
+    assert collapser.take_updates(now=seconds(30)) == [update]
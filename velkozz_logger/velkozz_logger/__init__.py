@@ -1,21 +1,64 @@
 # Importing Flask Modules:
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 
 # Importing Flask REST API modules:
 from flask_restful import Resource, Api
 
 # Declaring global libraries: 
 db = SQLAlchemy()
+migrate = Migrate()
 
-def init_app():
-    "Method that creates and initalizes the core flask application"
+def init_app(**config_overrides):
+    """Method that creates and initalizes the core flask application.
+    
+    Any keyword arguments are set as config values on top of the config object. The schema
+    is only created at boot if 'CREATE_SCHEMA_ON_BOOT' is set, otherwise it is managed by
+    the migrations (flask db upgrade).
+    """
     app = Flask(__name__, instance_relative_config=False)
     app.config.from_object("config.DevConfig")
     #app.config.from_object("config.ProdConfig")
+    app.config.update(config_overrides)
 
     # Initialize Plugins:
     db.init_app(app) # Database Connection
+    migrate.init_app(app, db) # Schema Migrations
+
+    # Configuring the log rate anomaly detector:
+    from .microservice_logger.anomaly_detection import log_rate_detector
+    log_rate_detector.init_app(app)
+
+    # Configuring the microservice heartbeat index:
+    from .microservice_logger.heartbeats import heartbeat_tracker
+    heartbeat_tracker.init_app(app)
+
+    # Configuring the ingest rate limits and sampling:
+    from .microservice_logger.ingest_limits import ingest_limiter, log_drop_counter
+    ingest_limiter.init_app(app)
+    log_drop_counter.init_app(app)
+
+    # Configuring the duplicate log collapsing mode:
+    from .microservice_logger.log_collapsing import log_collapser
+    log_collapser.init_app(app)
+
+    # Configuring the routing of logs to the shared or per microservice log tables:
+    from .microservice_logger.log_storage import log_storage
+    log_storage.init_app(app)
+
+    # Configuring the connection to the shared log writer process:
+    from .microservice_logger.ingest import log_writer_client, ingest_state_flusher
+    log_writer_client.init_app(app)
+    ingest_state_flusher.init_app(app)
+
+    # Configuring the microservice summary refresh schedule:
+    from .microservice_logger.summaries import summary_refresher
+    summary_refresher.init_app(app)
+
+    # Attaching the SQL statement profiling hooks if they are enabled:
+    from .query_profiling import query_profiler
+    query_profiler.init_app(app, db)
 
     # Adding Blueprints and Routes:
     with app.app_context():
@@ -26,7 +69,8 @@ def init_app():
         from . velkozz_rest_api_logger import routes as velkozz_rest_api_routes
 
         # Creating database schema:
-        db.create_all()
+        if app.config.get("CREATE_SCHEMA_ON_BOOT", True):
+            db.create_all()
 
         #  Registering Blueprints:
         app.register_blueprint(core_routes.core_bp, url_prefix="/")
@@ -0,0 +1,104 @@
+# Importing native python modules:
+from contextlib import asynccontextmanager
+
+# Importing ASGI modules:
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+from a2wsgi import WSGIMiddleware
+
+# Importing the Flask App Compiler:
+from . import init_app
+
+def init_asgi_app():
+    """Method that creates the ASGI application used to serve the ingest API asynchronously.
+
+    The POST '/microservices/api/' ingest route is served by an async endpoint that writes
+    logs through a pooled async database engine, so an in-flight ingest request no longer
+    holds a worker thread while it waits on Postgres. The request contract is the same as
+    MicroServiceLogs.post(). Every other route, including GET requests to the ingest API,
+    is served by the flask application mounted underneath it.
+    """
+    flask_app = init_app()
+    config = flask_app.config
+
+    # Importing the ingest path within the flask app context:
+    with flask_app.app_context():
+        from .microservice_logger.models import MicroServiceLog
+        from .microservice_logger.log_storage import log_storage
+        from .microservice_logger.ingest import (
+            LOG_FIELDS, build_log_record, screen_log_record, track_stored_record, flush_ingest_state,
+            ingest_state_flusher)
+
+    # Pooled async database engine for the ingest writes:
+    engine = create_async_engine(
+        config["ASYNC_SQLALCHEMY_DATABASE_URI"],
+        pool_size=config.get("ASYNC_DB_POOL_SIZE", 10),
+        max_overflow=config.get("ASYNC_DB_MAX_OVERFLOW", 20),
+        pool_pre_ping=True
+    )
+
+    def flush_in_app_context(force=False):
+        with flask_app.app_context():
+            flush_ingest_state(force=force)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Loading the registered microservices the logs are routed by before serving any logs:
+        await run_in_threadpool(flush_in_app_context)
+
+        # Flushing the in-memory ingest state from a background thread so the event loop is never blocked:
+        ingest_state_flusher.start(flask_app)
+        yield
+        await run_in_threadpool(flush_in_app_context, True)
+        await engine.dispose()
+
+    asgi_app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+    async def parse_log_args(request):
+        "Extracting the log fields from the json body, form body or query string like reqparse"
+        args = {field: None for field in LOG_FIELDS}
+        args.update(request.query_params)
+
+        if request.headers.get("content-type", "").startswith("application/json"):
+            args.update(await request.json())
+        else:
+            args.update(await request.form())
+
+        return args
+
+    @asgi_app.post("/microservices/api/")
+    async def ingest_log(request: Request):
+        try:
+            record = build_log_record(await parse_log_args(request))
+        except (Warning, ValueError, TypeError, SyntaxError) as error:
+            return PlainTextResponse(f"Log not Written to the database: {error}", status_code=400)
+
+        log_label = f"Log {record['app_name']}{record['process_type']}{record['created']}"
+
+        # Running the log through the rate limits, sampling and duplicate collapsing:
+        outcome = screen_log_record(record)
+        if outcome is not None:
+            return PlainTextResponse(f"{log_label} Not Stored: {outcome}", status_code=202)
+
+        # Writing the log through a pooled connection, w/o querying the registered microservices on the event loop:
+        log_table = log_storage.table_for(record["app_name"], refresh=False)
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(log_table.insert().values(**record))
+        except DBAPIError as error:
+            if not log_storage.falls_back_to_main_table(log_table, record["app_name"], error):
+                raise
+            async with engine.begin() as connection:
+                await connection.execute(MicroServiceLog.__table__.insert().values(**record))
+
+        track_stored_record(record)
+
+        return PlainTextResponse(f"{log_label} Successfully")
+
+    # Serving every other route through the flask application:
+    asgi_app.mount("/", WSGIMiddleware(flask_app))
+
+    return asgi_app
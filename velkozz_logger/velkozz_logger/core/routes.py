@@ -1,7 +1,10 @@
 # Importing Flask modules: 
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, abort
 from flask import current_app as app
 
+# Importing internal packages:
+from ..query_profiling import query_profiler
+
 # Blueprint Configuration: 
 core_bp = Blueprint(
     "core_bp", __name__,
@@ -12,4 +15,17 @@ core_bp = Blueprint(
 # Test Initial Route:
 @core_bp.route("/", methods=["GET"])
 def home():
-    return render_template("home.html")
\ No newline at end of file
+    return render_template("home.html")
+
+# Debug view of the slowest SQL statements, only avalible when query profiling is enabled:
+@core_bp.route("/debug/queries/", methods=["GET"])
+def query_profiling():
+    if not query_profiler.enabled:
+        abort(404)
+
+    return render_template(
+        "query_profiling.html",
+        statements=query_profiler.top_statements(app.config.get("QUERY_PROFILING_TOP_N", 25)),
+        profiled_requests=list(query_profiler.requests),
+        slow_ms=query_profiler.slow_ms
+    )
@@ -0,0 +1,293 @@
+# Importing native python modules:
+import os
+import time
+import queue
+import signal
+import socket
+import logging
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener
+
+# Importing werkzeug modules:
+from werkzeug.wsgi import ClosingIterator
+
+# Importing the Flask App Compiler:
+from . import init_app
+
+logger = logging.getLogger(__name__)
+
+class LogWriter(object):
+    """The single process that writes the logs handed over by all of the ingest processes.
+
+    Each ingest process connection is drained by its own receiver thread into a shared
+    queue. The writer loop takes up to 'batch_size' records off the queue, waiting at most
+    'batch_seconds' for a batch to fill, sorts them by their 'created' primary key and
+    writes them with a single multi-row insert. Keeping all of the inserts in one process
+    removes the index lock contention of many workers committing single rows.
+
+    The ingest processes acknowledge a log once it has been handed to the writer, before it
+    is committed, so acknowledgement is at-most-once: a log the writer fails to insert (eg: a
+    'created' primary key conflict, or the writer being killed w/ records still queued) is
+    logged as an error rather than returned to its emitter as a failed request.
+    """
+    def __init__(self, app, address, batch_size=1000, batch_seconds=0.5):
+        self.app = app
+        self.address = address
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self._records = queue.Queue()
+        self._running = True
+
+    def receive(self, connection):
+        "Method that moves the records sent over a single ingest process connection onto the queue"
+        try:
+            while self._running:
+                self._records.put(connection.recv())
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def accept(self, listener):
+        "Method that starts a receiver thread for every ingest process that connects"
+        while self._running:
+            try:
+                connection = listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self.receive, args=(connection,), daemon=True).start()
+
+    def next_batch(self):
+        "Method that waits up to a second for a record to be avalible, then collects a batch of records"
+        try:
+            batch = [self._records.get(timeout=1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.batch_seconds
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._records.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def write_batch(self, batch):
+        """Method that writes a batch of records in 'created' order with one multi-row insert per log table.
+
+        If the insert fails (eg: two logs sharing a 'created' primary key) the batch is
+        rolled back and written row by row so that only the conflicting logs are lost. A log
+        whose microservice table no longer exists is written to the main table instead.
+        """
+        if not batch:
+            return
+
+        from sqlalchemy.exc import DBAPIError
+        from .microservice_logger.models import MicroServiceLog, db
+        from .microservice_logger.log_storage import log_storage
+
+        # Grouping the records by the log table of their microservice:
+        batch.sort(key=lambda record: record["created"])
+        table_batches = {}
+        for record in batch:
+            table_batches.setdefault(log_storage.table_for(record["app_name"]), []).append(record)
+
+        try:
+            for log_table, records in table_batches.items():
+                db.session.execute(log_table.insert(), records)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            failed = []
+            for record in batch:
+                log_table = log_storage.table_for(record["app_name"])
+                try:
+                    try:
+                        db.session.execute(log_table.insert(), [record])
+                        db.session.commit()
+                    except DBAPIError as error:
+                        db.session.rollback()
+                        if not log_storage.falls_back_to_main_table(log_table, record["app_name"], error):
+                            raise
+                        db.session.execute(MicroServiceLog.__table__.insert(), [record])
+                        db.session.commit()
+                except Exception as error:
+                    db.session.rollback()
+                    failed.append((record, error))
+
+            # The logs were already acknowledged to their emitters, so they can only be reported:
+            if failed:
+                record, error = failed[0]
+                logger.error(
+                    "Log writer dropped %s of %s logs in a batch, first dropped log %s%s: %s",
+                    len(failed), len(batch), record["app_name"], record["created"], error)
+
+    def stop(self, *args):
+        self._running = False
+
+    def run(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+        listener = Listener(self.address, family="AF_UNIX")
+        threading.Thread(target=self.accept, args=(listener,), daemon=True).start()
+
+        from .microservice_logger.log_storage import log_storage
+
+        signal.signal(signal.SIGTERM, self.stop)
+        with self.app.app_context():
+            while self._running or not self._records.empty():
+                try:
+                    log_storage.refresh_if_due()
+                    self.write_batch(self.next_batch())
+                except Exception:
+                    logger.exception("Error writing a batch of logs")
+
+        listener.close()
+
+def run_log_writer(address, batch_size, batch_seconds):
+    "Process target that runs the shared log writer"
+    app = init_app()
+    LogWriter(app, address, batch_size, batch_seconds).run()
+
+class InFlightRequests(object):
+    "WSGI middleware that counts the requests being handled, so a stopping ingest process can wait for them"
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._condition = threading.Condition()
+        self._count = 0
+
+    def __call__(self, environ, start_response):
+        with self._condition:
+            self._count += 1
+        try:
+            return ClosingIterator(self.wsgi_app(environ, start_response), [self.finished])
+        except BaseException:
+            self.finished()
+            raise
+
+    def finished(self):
+        with self._condition:
+            self._count -= 1
+            self._condition.notify_all()
+
+    def wait(self, timeout):
+        "Method that waits up to 'timeout' seconds for the requests being handled to finish, returning how many are left"
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._count > 0 and deadline > time.monotonic():
+                self._condition.wait(deadline - time.monotonic())
+            return self._count
+
+def run_ingest_process(host, port, listen_fd, address, workers):
+    """Process target that serves the flask app on the shared listening socket, handing logs to the writer.
+
+    On SIGTERM or SIGINT the process stops accepting connections, waits up to
+    'INGEST_SHUTDOWN_SECONDS' for the requests it is handling to finish and then flushes its
+    in-memory ingest state (log rates, heartbeats, drop rollup and collapsed occurrences).
+
+    The process is served by werkzeug's threaded server, which is not hardened for direct
+    exposure to untrusted clients, so it should be run behind a reverse proxy.
+    """
+    from werkzeug.serving import make_server
+    from .microservice_logger.ingest import flush_ingest_state
+
+    app = init_app(INGEST_WRITER_ADDRESS=address, INGEST_WORKERS=workers, CREATE_SCHEMA_ON_BOOT=False)
+    in_flight = app.wsgi_app = InFlightRequests(app.wsgi_app)
+    server = make_server(host, port, app, threaded=True, fd=listen_fd)
+
+    # Stopping the server from another thread, shutdown() blocks until serve_forever() returns:
+    def stop(*args):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    server.serve_forever()
+
+    unfinished = in_flight.wait(app.config.get("INGEST_SHUTDOWN_SECONDS", 10))
+    if unfinished:
+        logger.warning("Ingest process stopped w/ %s requests still being handled", unfinished)
+
+    with app.app_context():
+        flush_ingest_state(force=True)
+
+class IngestSupervisor(object):
+    """The supervisor of a sharded ingest deployment.
+
+    The supervisor binds the listening socket once and forks 'processes' ingest processes
+    that all accept connections from it. The ingest processes parse, validate and screen
+    the logs and hand them to the single writer process over a unix socket. Processes that
+    exit are restarted until the supervisor is stopped.
+    """
+    def __init__(self, host, port, processes, address, batch_size=1000, batch_seconds=0.5):
+        self.host = host
+        self.port = port
+        self.processes = processes
+        self.address = address
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self._context = multiprocessing.get_context("fork")
+        self._running = True
+
+    def start_writer(self):
+        writer = self._context.Process(
+            target=run_log_writer, args=(self.address, self.batch_size, self.batch_seconds),
+            name="velkozz_log_writer")
+        writer.start()
+
+        # Waiting for the writer to listen before starting any ingest processes:
+        while not os.path.exists(self.address) and writer.is_alive():
+            time.sleep(0.05)
+
+        return writer
+
+    def start_ingest_process(self, listen_fd, index):
+        process = self._context.Process(
+            target=run_ingest_process, args=(self.host, self.port, listen_fd, self.address, self.processes),
+            name=f"velkozz_ingest_{index}")
+        process.start()
+        return process
+
+    def stop(self, *args):
+        self._running = False
+
+    def run(self):
+        listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listen_socket.bind((self.host, self.port))
+        listen_socket.listen(1024)
+        listen_socket.set_inheritable(True)
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        writer = self.start_writer()
+        ingest_processes = [
+            self.start_ingest_process(listen_socket.fileno(), index) for index in range(self.processes)]
+
+        # Restarting any process that exits until the supervisor is stopped:
+        while self._running:
+            time.sleep(0.5)
+            if not writer.is_alive():
+                logger.warning("Log writer exited with code %s, restarting", writer.exitcode)
+                writer = self.start_writer()
+            for index, process in enumerate(ingest_processes):
+                if not process.is_alive():
+                    logger.warning("Ingest process %s exited with code %s, restarting", index, process.exitcode)
+                    ingest_processes[index] = self.start_ingest_process(listen_socket.fileno(), index)
+
+        # Stopping the ingest processes first so the writer can drain the records they sent:
+        for process in ingest_processes:
+            process.terminate()
+        for process in ingest_processes:
+            process.join()
+
+        writer.terminate()
+        writer.join()
+        listen_socket.close()
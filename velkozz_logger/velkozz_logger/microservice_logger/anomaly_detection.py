@@ -0,0 +1,373 @@
+# Importing native python modules:
+import math
+import time
+import datetime
+import threading
+import collections
+
+# Importing internal packages:
+from .models import MicroServiceLogRate, db
+from .upserts import dialect_insert, upsert_rows
+
+# Object describing a single anomaly flagged by the detector:
+LogRateAnomaly = collections.namedtuple(
+    "LogRateAnomaly",
+    ["app_name", "levelname", "kind", "detected_at", "observed", "expected"]
+)
+
+class LogSeriesState(object):
+    """The streaming statistics maintained for a single (app_name, levelname) log series.
+
+    Each settled bucket count is folded into an exponentially weighted mean/variance and a
+    rolling quantile estimate so that the memory used by a series never grows with the
+    number of logs ingested.
+    """
+    __slots__ = (
+        "next_bucket", "mean", "var", "quantile", "buckets_seen",
+        "last_active", "last_seen", "gap_mean", "flagged_bucket"
+    )
+
+    def __init__(self, next_bucket):
+        self.next_bucket = next_bucket
+        self.mean = 0.0
+        self.var = 0.0
+        self.quantile = 0.0
+        self.buckets_seen = 0
+        self.last_active = None
+        self.last_seen = None
+        self.gap_mean = None
+        self.flagged_bucket = None
+
+class LogRateDetector(object):
+    """An incremental detector for bursts and silences in the log rates of microservices.
+
+    Every log ingested by the REST API is passed to observe(), which only counts it against
+    its time bucket in memory. The counts are periodically added onto the shared
+    'microservice-log-rates' table, so the counts read back are the logs ingested by every
+    worker process rather than the share of them that reached this one.
+
+    The background flush of every worker (see IngestStateFlusher) then calls sync(), which
+    loads the buckets added since the last sync and folds each settled bucket (one that
+    closed long enough ago that every worker has flushed it) into the EWMA rate statistics
+    and rolling quantile of its (app_name, levelname) series. A burst is flagged when the count of a bucket exceeds
+    both the EWMA mean plus a number of standard deviations and the rolling quantile, which
+    is checked for the open buckets as well so bursts are flagged while they happen.
+    Silences compare the time since a microservice's last active bucket against its typical
+    gap between active buckets.
+
+    Every worker folds the same shared counts, so the flags do not depend on which worker
+    serves the page.
+    """
+    # Series key used for the aggregate rate of a microservice across all log levels:
+    ALL_LEVELS = "*"
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._pending = {}
+        self._series = {}
+        self._flags = {}
+        self._synced_until = None
+        self._started = time.time()
+        self._last_flush = time.time()
+
+        # Default detector params, overwritten by the app config in init_app():
+        self.bucket_seconds = 60
+        self.alpha = 0.1
+        self.burst_sigma = 4.0
+        self.burst_quantile = 0.99
+        self.burst_min_count = 20
+        self.silence_factor = 5.0
+        self.silence_min_seconds = 900
+        self.flag_ttl_seconds = 3600
+        self.flush_seconds = 10
+        self.flush_check_seconds = 5
+        self.history_buckets = 1440
+
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def settle_seconds(self):
+        """The time after a bucket closes by which every worker has flushed its counts, as the
+        counts are flushed once 'flush_seconds' have passed at the next check of the flush timer.
+        """
+        return self.flush_seconds + 2 * self.flush_check_seconds
+
+    @property
+    def history_seconds(self):
+        return self.history_buckets * self.bucket_seconds
+
+    def init_app(self, app):
+        "Method that configures the detector params from the flask app config"
+        self.bucket_seconds = app.config.get("ANOMALY_BUCKET_SECONDS", self.bucket_seconds)
+        self.alpha = app.config.get("ANOMALY_EWMA_ALPHA", self.alpha)
+        self.burst_sigma = app.config.get("ANOMALY_BURST_SIGMA", self.burst_sigma)
+        self.burst_quantile = app.config.get("ANOMALY_BURST_QUANTILE", self.burst_quantile)
+        self.burst_min_count = app.config.get("ANOMALY_BURST_MIN_COUNT", self.burst_min_count)
+        self.silence_factor = app.config.get("ANOMALY_SILENCE_FACTOR", self.silence_factor)
+        self.silence_min_seconds = app.config.get("ANOMALY_SILENCE_MIN_SECONDS", self.silence_min_seconds)
+        self.flag_ttl_seconds = app.config.get("ANOMALY_FLAG_TTL_SECONDS", self.flag_ttl_seconds)
+        self.flush_seconds = app.config.get("ANOMALY_FLUSH_SECONDS", self.flush_seconds)
+        self.flush_check_seconds = app.config.get("INGEST_STATE_FLUSH_SECONDS", self.flush_check_seconds)
+        self.history_buckets = app.config.get("ANOMALY_HISTORY_BUCKETS", self.history_buckets)
+
+    def observe(self, app_name, levelname, timestamp=None, count=1):
+        """Method that counts newly ingested logs against their time bucket.
+
+        The logs are counted against both the level specific series and the aggregate series
+        of the microservice. The arrival time on the server is used rather than the 'created'
+        timestamp of the log so that clock skew on the emitters does not distort the rates.
+        """
+        now = time.time() if timestamp is None else timestamp
+        bucket_start = self._bucket_start(now)
+
+        with self._lock:
+            for key in ((app_name, levelname, bucket_start), (app_name, self.ALL_LEVELS, bucket_start)):
+                self._pending[key] = self._pending.get(key, 0) + count
+
+    def take_pending(self):
+        "Method that takes the bucket counts observed since the last flush"
+        with self._lock:
+            self._last_flush = time.time()
+            pending, self._pending = self._pending, {}
+
+        return pending
+
+    def flush_if_due(self):
+        "Method that flushes the pending bucket counts if the flush interval has passed"
+        if time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Method that adds the pending bucket counts onto the shared rate table and prunes the
+        buckets that have fallen out of the history.
+
+        The counts that fail to write are put back into the pending counts and retried on the
+        next flush, unless the database rejected them, see upsert_rows().
+        """
+        pending = self.take_pending()
+        if not pending:
+            return
+
+        rate_table = MicroServiceLogRate.__table__
+        statement = dialect_insert(rate_table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["app_name", "levelname", "bucket_start"],
+            set_={"count": rate_table.c.count + statement.excluded.count}
+        )
+
+        retry_rows = upsert_rows(statement, [
+            {
+                "app_name": app_name, "levelname": levelname,
+                "bucket_start": datetime.datetime.fromtimestamp(bucket_start), "count": count
+            }
+            for (app_name, levelname, bucket_start), count in pending.items()
+        ], ["app_name", "levelname", "bucket_start"])
+
+        with self._lock:
+            for row in retry_rows:
+                key = (row["app_name"], row["levelname"], row["bucket_start"].timestamp())
+                self._pending[key] = self._pending.get(key, 0) + row["count"]
+
+        try:
+            MicroServiceLogRate.query.filter(
+                MicroServiceLogRate.bucket_start < datetime.datetime.fromtimestamp(
+                    time.time() - self.history_seconds)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def load_counts(self, since):
+        "Method that reads the shared bucket counts from 'since' onwards as a dict of series key to bucket counts"
+        series_counts = {}
+        rates = db.session.query(
+            MicroServiceLogRate.app_name,
+            MicroServiceLogRate.levelname,
+            MicroServiceLogRate.bucket_start,
+            MicroServiceLogRate.count).filter(
+                MicroServiceLogRate.bucket_start >= datetime.datetime.fromtimestamp(since))
+
+        for app_name, levelname, bucket_start, count in rates.yield_per(10000):
+            series_counts.setdefault((app_name, levelname), {})[bucket_start.timestamp()] = count
+
+        return series_counts
+
+    def sync(self, now=None):
+        """Method that folds the bucket counts added to the shared rate table since the last sync
+        into the series statistics, see fold_counts().
+
+        The first sync of a worker loads the whole history, so it is only called from the
+        background flush rather than from a request.
+        """
+        now = time.time() if now is None else now
+
+        since = self._synced_until if self._synced_until is not None else now - self.history_seconds
+        series_counts = self.load_counts(since)
+        db.session.rollback()
+
+        with self._state_lock:
+            self.fold_counts(series_counts, now)
+
+    def flags(self, microservice_names=(), now=None):
+        """Method that returns all of the currently active anomalies from the series statistics
+        as of the last sync, see evaluate(). Until the first sync of the worker there are none.
+        """
+        now = time.time() if now is None else now
+
+        with self._state_lock:
+            return self.evaluate(microservice_names, now)
+
+    def fold_counts(self, series_counts, now):
+        """Method that folds the bucket counts of 'series_counts' into the series statistics.
+
+        Buckets that have settled are folded in order, w/ the empty buckets between them
+        decaying the stats. Buckets that are still open are only checked for bursts, they
+        are folded once they settle. Series that have not logged within the history are
+        dropped.
+        """
+        horizon = self._bucket_start(now - self.settle_seconds)
+
+        for key, counts in series_counts.items():
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = LogSeriesState(min(counts))
+
+            for bucket_start in sorted(counts):
+                count = counts[bucket_start]
+                if bucket_start < state.next_bucket:
+                    continue
+
+                if count > 0 and (state.last_seen is None or bucket_start > state.last_seen):
+                    state.last_seen = bucket_start
+                self._check_burst(key, state, bucket_start, count)
+
+                if bucket_start < horizon:
+                    self._fold_empty_buckets(state, bucket_start)
+                    self._fold_bucket(state, count)
+                    if count > 0:
+                        self._fold_activity(state, bucket_start)
+                    state.next_bucket = bucket_start + self.bucket_seconds
+
+        # Empty settled buckets decay the stats of every series:
+        for key, state in list(self._series.items()):
+            self._fold_empty_buckets(state, horizon)
+            if state.last_seen is None or state.last_seen < now - self.history_seconds:
+                del self._series[key]
+
+        self._synced_until = horizon
+
+    def evaluate(self, microservice_names, now):
+        """Method that evaluates the active anomalies from the series statistics.
+
+        Burst flags expire after the configured ttl. Silences are computed for every
+        microservice that has logged within the history as well as for each of the registered
+        'microservice_names' that has not logged at all once the detector has been running
+        longer than the minimum silence period.
+        """
+        anomalies = []
+
+        # Expiring old burst flags:
+        for key, anomaly in list(self._flags.items()):
+            if now - anomaly.detected_at > self.flag_ttl_seconds:
+                del self._flags[key]
+            else:
+                anomalies.append(anomaly)
+
+        # Checking every aggregate microservice series for silences:
+        for (app_name, levelname), state in self._series.items():
+            if levelname != self.ALL_LEVELS:
+                continue
+            silence = self._check_silence(app_name, state, now)
+            if silence is not None:
+                anomalies.append(silence)
+
+        # Registered microservices that have not logged within the history:
+        if now - self._started > self.silence_min_seconds:
+            for app_name in microservice_names:
+                if (app_name, self.ALL_LEVELS) not in self._series:
+                    anomalies.append(LogRateAnomaly(
+                        app_name, self.ALL_LEVELS, "silence", now, None, None))
+
+        return sorted(anomalies, key=lambda anomaly: anomaly.detected_at, reverse=True)
+
+    def _check_burst(self, key, state, bucket_start, count):
+        "Method that flags a burst once per bucket when its count exceeds both thresholds"
+        if state.flagged_bucket == bucket_start:
+            # Updating the count of a burst flagged while its bucket was still open:
+            anomaly = self._flags.get(key)
+            if anomaly is not None and anomaly.detected_at == bucket_start and count > anomaly.observed:
+                self._flags[key] = anomaly._replace(observed=count)
+            return
+
+        if state.buckets_seen == 0:
+            return
+
+        expected = max(
+            state.mean + self.burst_sigma * math.sqrt(state.var),
+            state.quantile,
+            self.burst_min_count
+        )
+        if count > expected:
+            state.flagged_bucket = bucket_start
+            self._flags[key] = LogRateAnomaly(key[0], key[1], "burst", bucket_start, count, round(expected, 2))
+
+    def _fold_empty_buckets(self, state, until):
+        "Method that folds the empty buckets between the last folded bucket and 'until', capped so a long silence costs O(1)"
+        elapsed_buckets = int((until - state.next_bucket) // self.bucket_seconds)
+        for _ in range(min(elapsed_buckets, 60)):
+            self._fold_bucket(state, 0)
+
+        if elapsed_buckets > 0:
+            state.next_bucket += elapsed_buckets * self.bucket_seconds
+
+    def _fold_bucket(self, state, bucket_count):
+        "Method that folds a settled bucket count into the EWMA and rolling quantile"
+        if state.buckets_seen == 0:
+            state.mean = float(bucket_count)
+            state.quantile = float(bucket_count)
+        else:
+            diff = bucket_count - state.mean
+            increment = self.alpha * diff
+            state.mean += increment
+            state.var = (1 - self.alpha) * (state.var + diff * increment)
+
+            # Stochastic approximation of the quantile, step scaled to the spread of the series:
+            step = self.alpha * max(math.sqrt(state.var), 1.0)
+            if bucket_count > state.quantile:
+                state.quantile += step * self.burst_quantile
+            else:
+                state.quantile -= step * (1 - self.burst_quantile)
+
+        state.buckets_seen += 1
+
+    def _fold_activity(self, state, bucket_start):
+        "Method that tracks the typical gap between the active buckets of a series for silence detection"
+        if state.last_active is not None:
+            gap = bucket_start - state.last_active
+            if state.gap_mean is None:
+                state.gap_mean = gap
+            else:
+                state.gap_mean += self.alpha * (gap - state.gap_mean)
+        state.last_active = bucket_start
+
+    def _check_silence(self, app_name, state, now):
+        "Method that determines if a microservice has stopped logging"
+        last_seen = state.last_seen + self.bucket_seconds
+        silent_for = now - last_seen
+        threshold = self.silence_min_seconds
+        if state.gap_mean is not None:
+            threshold = max(threshold, self.silence_factor * state.gap_mean)
+
+        if silent_for > threshold:
+            return LogRateAnomaly(
+                app_name, self.ALL_LEVELS, "silence", last_seen, round(silent_for), round(threshold))
+
+        return None
+
+    def _bucket_start(self, now):
+        return now - (now % self.bucket_seconds)
+
+# Detector shared by all requests within the worker process:
+log_rate_detector = LogRateDetector()
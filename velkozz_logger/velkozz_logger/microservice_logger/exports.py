@@ -0,0 +1,150 @@
+# Importing native python modules:
+import io
+import csv
+import json
+import datetime
+
+# Importing internal packages:
+from .models import MicroServiceLog, db
+
+# The content types of each of the supported export formats:
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+def build_export_query(log_table, app_name=None, levels=None, start=None, end=None):
+    "Method that builds the select statement of the logs in 'log_table' matching the export filters, oldest first"
+    query = log_table.select()
+
+    if app_name is not None:
+        query = query.where(log_table.c.app_name == app_name)
+    if levels:
+        query = query.where(log_table.c.levelname.in_(levels))
+    if start is not None:
+        query = query.where(log_table.c.created >= start)
+    if end is not None:
+        query = query.where(log_table.c.created <= end)
+
+    return query.order_by(log_table.c.created)
+
+def stream_log_rows(query, chunk_size):
+    """Method that yields chunks of rows from a server side cursor.
+
+    The rows are read on a dedicated connection rather than the request's session, with
+    'stream_results' set so postgres only ever sends 'chunk_size' rows at a time. The memory
+    used by an export is therefore constant no matter how many logs it contains.
+    """
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+def serialize_value(value):
+    "Method that converts timestamps to ISO 8601 strings w/ full microsecond precision"
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+def export_csv(columns, chunks):
+    "Method that yields the logs as CSV, one encoded block per chunk of rows"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([serialize_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Yielding the header of an empty export:
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_ndjson(columns, chunks):
+    "Method that yields the logs as newline delimited JSON objects, one encoded block per chunk of rows"
+    for rows in chunks:
+        yield "".join(
+            json.dumps({column: serialize_value(value) for column, value in zip(columns, row)}) + "\n"
+            for row in rows
+        )
+
+class ParquetChunkSink(object):
+    "A write only file object that collects the bytes written by the parquet writer until they are taken"
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def export_parquet(columns, chunks):
+    """Method that yields the logs as a parquet file, writing one row group per chunk of rows.
+
+    Requires the optional pyarrow dependency, see parquet_available().
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Mapping the log table column types to arrow types:
+    arrow_types = {
+        db.String: pa.string(), db.Text: pa.string(), db.Integer: pa.int64(),
+        db.Float: pa.float64(), db.TIMESTAMP: pa.timestamp("us"), db.Date: pa.date32()
+    }
+    log_table = MicroServiceLog.__table__
+    schema = pa.schema([
+        (column, next(
+            (arrow_type for column_type, arrow_type in arrow_types.items()
+             if isinstance(log_table.c[column].type, column_type)), pa.string()))
+        for column in columns
+    ])
+
+    sink = ParquetChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=schema.field(index).type) for index, values in enumerate(zip(*rows))],
+            schema=schema))
+        yield sink.take()
+
+    writer.close()
+    yield sink.take()
+
+def parquet_available():
+    "Method that checks if the optional pyarrow dependency needed for parquet exports is installed"
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
+
+# The serializer of each of the supported export formats:
+EXPORTERS = {
+    "csv": export_csv,
+    "ndjson": export_ndjson,
+    "parquet": export_parquet
+}
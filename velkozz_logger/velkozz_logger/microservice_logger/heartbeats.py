@@ -0,0 +1,98 @@
+# Importing native python modules:
+import time
+import threading
+
+# Importing internal packages:
+from .models import MicroserviceHeartbeat
+from .upserts import dialect_insert, greatest, upsert_rows
+
+class HeartbeatTracker(object):
+    """The in-memory index of the last time each app_name logged, overall and per log level.
+
+    The ingest path calls record() for every log, which only updates a dict. The dirty
+    entries are periodically flushed to the small 'microservice-heartbeats' table so that
+    the staleness of every microservice (registered or not) can be read back with a single
+    query instead of a MAX(created) scan of the log table per microservice.
+    """
+    # The levelname used for the heartbeat of a log made at any level:
+    ALL_LEVELS = "*"
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._last_seen = {}
+        self._dirty = set()
+        self._last_flush = time.time()
+        self.flush_seconds = 30
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        "Method that configures the flush interval from the flask app config"
+        self.flush_seconds = app.config.get("HEARTBEAT_FLUSH_SECONDS", self.flush_seconds)
+
+    def record(self, app_name, levelname, created):
+        "Method that updates the last seen timestamps of an app_name with a newly ingested log"
+        with self._lock:
+            for key in ((app_name, self.ALL_LEVELS), (app_name, levelname)):
+                last_seen = self._last_seen.get(key)
+                if last_seen is None or created > last_seen:
+                    self._last_seen[key] = created
+                    self._dirty.add(key)
+
+    def flush_if_due(self):
+        "Method that flushes the dirty heartbeats if the flush interval has passed"
+        if time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Method that writes all of the dirty heartbeats to the database.
+
+        Each heartbeat is upserted w/ the greater of the stored and flushed last seen, so
+        several workers flushing their own views of the heartbeats at once never conflict or
+        overwrite a newer last seen. The heartbeats that fail to write are marked dirty again
+        and retried on the next flush, unless the database rejected them, see upsert_rows().
+        """
+        with self._lock:
+            self._last_flush = time.time()
+            if not self._dirty:
+                return
+            pending = {key: self._last_seen[key] for key in self._dirty}
+            self._dirty = set()
+
+        heartbeat_table = MicroserviceHeartbeat.__table__
+        statement = dialect_insert(heartbeat_table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["app_name", "levelname"],
+            set_={"last_seen": greatest(heartbeat_table.c.last_seen, statement.excluded.last_seen)}
+        )
+
+        retry_rows = upsert_rows(statement, [
+            {"app_name": app_name, "levelname": levelname, "last_seen": last_seen}
+            for (app_name, levelname), last_seen in pending.items()
+        ], ["app_name", "levelname"])
+
+        with self._lock:
+            self._dirty.update((row["app_name"], row["levelname"]) for row in retry_rows)
+
+    def heartbeats(self):
+        """Method that reads the last seen timestamps of every app_name that has logged.
+
+        Returns a dict of app_name to a dict of levelname to last seen timestamp. The
+        flushed heartbeats are read with a single query and merged with the heartbeats
+        this worker has not flushed yet.
+        """
+        heartbeats = {}
+        for heartbeat in MicroserviceHeartbeat.query.all():
+            heartbeats.setdefault(heartbeat.app_name, {})[heartbeat.levelname] = heartbeat.last_seen
+
+        with self._lock:
+            for (app_name, levelname), last_seen in self._last_seen.items():
+                levels = heartbeats.setdefault(app_name, {})
+                if levelname not in levels or last_seen > levels[levelname]:
+                    levels[levelname] = last_seen
+
+        return heartbeats
+
+# Heartbeat index shared by all requests within the worker process:
+heartbeat_tracker = HeartbeatTracker()
@@ -0,0 +1,236 @@
+# Importing native python modules:
+import ast
+import time
+import logging
+import datetime
+import threading
+from multiprocessing.connection import Client
+
+# Importing SQLAlchemy modules:
+from sqlalchemy.exc import DBAPIError
+
+# Importing internal packages:
+from .models import MicroServiceLog, db
+from .log_storage import log_storage
+from .anomaly_detection import log_rate_detector
+from .heartbeats import heartbeat_tracker
+from .ingest_limits import ingest_limiter, log_drop_counter
+from .log_collapsing import log_collapser, log_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# The python logging fields that must be present in every log posted to the ingest API:
+LOG_FIELDS = {
+    'args', 'created', 'lineno', 'msecs', 'relativeCreated',
+    'thread', 'name', 'msg', 'levelname', 'funcName', 'threadName',
+    'processName', 'process'
+}
+
+# The logging fields that may be posted as None, eg: when the emitter disabled logMultiprocessing:
+OPTIONAL_LOG_FIELDS = {'msg', 'funcName', 'threadName', 'processName', 'process'}
+
+# The fields the in-memory ingest state is keyed by and their maximum column length:
+KEY_FIELDS_MAX_LENGTH = 100
+
+# The outcome of screening a log that is not written as a new row:
+COLLAPSED = "collapsed"
+
+def build_log_record(args):
+    """Method that converts the fields of a posted python log into the column values of
+    a MicroServiceLog row.
+
+    The 'args' field of a velkozz log is the string form of the (app_name, process_type,
+    status_code) tuple passed to the logger. A Warning is raised if any of the logging
+    fields are missing and a ValueError if the app_name or levelname are not strings that
+    fit their columns, as the in-memory ingest state is keyed by them.
+    """
+    # The parsers fill the missing fields w/ None:
+    missing_fields = sorted(field for field in LOG_FIELDS - OPTIONAL_LOG_FIELDS if args.get(field) is None)
+    if missing_fields:
+        raise Warning(f"Missing the log fields {', '.join(missing_fields)}")
+
+    # Converting the string tuple to actual tuple and unpacking:
+    app_name, process_type, status_code = ast.literal_eval(args["args"])
+
+    for field, value in (("app_name", app_name), ("levelname", args["levelname"])):
+        if not isinstance(value, str) or not value or len(value) > KEY_FIELDS_MAX_LENGTH:
+            raise ValueError(f"'{field}' must be a string of 1 to {KEY_FIELDS_MAX_LENGTH} characters")
+
+    # Converting the arguments to the correct data types:
+    created_obj = datetime.datetime.fromtimestamp(float(args["created"]))
+
+    return {
+        "name": args["name"],
+        "msg": args["msg"],
+        "app_name": app_name,
+        "process_type": process_type,
+        "status_code": int(status_code),
+        "levelname": args["levelname"],
+        "created": created_obj,
+        "lineno": int(args["lineno"]),
+        "funcName": args["funcName"],
+        "msecs": float(args["msecs"]),
+        "relativeCreated": datetime.datetime.fromtimestamp(float(args["relativeCreated"])),
+        "thread": int(args["thread"]),
+        "threadName": args["threadName"],
+        "processName": args["processName"],
+        "process": args["process"],
+        "fingerprint": None,
+        "last_seen": created_obj,
+        "occurrences": 1
+    }
+
+def screen_log_record(record):
+    """Method that runs a log record through the in-memory stages of the ingest path.
+
+    The log is counted by the anomaly detector and heartbeat index, then checked against
+    the rate limits and sampling and finally against the open duplicate collapse groups.
+    Returns None if the record should be written as a new row, otherwise the reason it
+    was not (a drop reason of the ingest limiter or COLLAPSED).
+    """
+    app_name, levelname, created = record["app_name"], record["levelname"], record["created"]
+
+    # Updating the streaming log rate statistics and heartbeats of the microservice:
+    log_rate_detector.observe(app_name, levelname)
+    heartbeat_tracker.record(app_name, levelname, created)
+
+    # Dropping the log if it is rate limited or sampled, counting it in the drop rollup:
+    drop_reason = ingest_limiter.admit(app_name, levelname, record["msg"])
+    if drop_reason is not None:
+        log_drop_counter.record(app_name, levelname, created)
+        return drop_reason
+
+    # Absorbing repeats of an already stored log when duplicate collapsing is enabled:
+    if log_collapser.enabled:
+        record["fingerprint"] = log_fingerprint(
+            app_name, levelname, record["funcName"], record["lineno"], record["msg"])
+        if log_collapser.absorb(record["fingerprint"], created):
+            return COLLAPSED
+
+    return None
+
+class LogWriterClient(object):
+    """The connection from an ingest process to the shared log writer process.
+
+    When the 'INGEST_WRITER_ADDRESS' config is set the ingest process does not write logs
+    itself, it hands each record to the writer over a local unix socket and the writer
+    performs large ordered batch inserts. The connection is opened lazily and shared by
+    all of the request threads of the process.
+    """
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._connection = None
+        self.address = None
+
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def enabled(self):
+        return self.address is not None
+
+    def init_app(self, app):
+        "Method that configures the writer address from the flask app config"
+        self.address = app.config.get("INGEST_WRITER_ADDRESS")
+
+    def send(self, record):
+        "Method that hands a record to the writer, reconnecting once if the writer was restarted"
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._connection is None:
+                        self._connection = Client(self.address, family="AF_UNIX")
+                    self._connection.send(record)
+                    return
+                except (OSError, EOFError):
+                    self._connection = None
+                    if attempt == 1:
+                        raise
+
+# Writer connection shared by all requests within the ingest process:
+log_writer_client = LogWriterClient()
+
+def store_log_record(record):
+    "Method that writes a record to the database, or hands it to the shared log writer if one is configured"
+    if log_writer_client.enabled:
+        log_writer_client.send(record)
+    else:
+        log_model = log_storage.model_for(record["app_name"])
+        try:
+            db.session.add(log_model(**record))
+            db.session.commit()
+        except DBAPIError as error:
+            db.session.rollback()
+            if not log_storage.falls_back_to_main_table(log_model.__table__, record["app_name"], error):
+                raise
+            db.session.add(MicroServiceLog(**record))
+            db.session.commit()
+
+def track_stored_record(record):
+    "Method that opens a duplicate collapse group for a record that has been written to the database"
+    if record["fingerprint"] is not None:
+        log_collapser.track(record["fingerprint"], record["created"], record["app_name"])
+
+def flush_ingest_state(force=False):
+    """Method that flushes the in-memory ingest state (log rate buckets, heartbeats, drop rollup
+    and collapsed occurrences) to the database and refreshes the registered microservices the logs are
+    routed by. Unless 'force' is set each is only flushed once its flush interval has passed.
+    Must be called within the flask app context.
+
+    A failed flush is logged rather than raised, as it runs after the log that triggered it
+    has been stored. The state that failed to flush is kept and retried on the next flush.
+    """
+    log_storage.refresh_if_due()
+
+    for state in (log_rate_detector, heartbeat_tracker, log_drop_counter, log_collapser):
+        try:
+            if force:
+                state.flush()
+            else:
+                state.flush_if_due()
+        except Exception:
+            logger.exception("Error flushing the %s ingest state", type(state).__name__)
+
+class IngestStateFlusher(object):
+    """The background flush of the in-memory ingest state of a worker.
+
+    The first request of each worker starts a daemon thread that calls flush_ingest_state()
+    every 'INGEST_STATE_FLUSH_SECONDS' and then syncs the anomaly detector w/ the shared log
+    rate counts. The state of a worker that stops receiving logs is therefore still flushed
+    within its flush interval, and the home page never loads the log rate table itself.
+    """
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.flush_seconds = 5
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        "Method that configures the flush timer from the flask app config"
+        self.flush_seconds = app.config.get("INGEST_STATE_FLUSH_SECONDS", self.flush_seconds)
+
+    def start(self, app):
+        "Method that starts the background flush thread of this worker if it is not running"
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.run, args=(app,), name="velkozz_ingest_state_flusher", daemon=True)
+                self._thread.start()
+
+    def run(self, app):
+        while True:
+            try:
+                with app.app_context():
+                    flush_ingest_state()
+                    log_rate_detector.sync()
+            except Exception:
+                logger.exception("Error flushing the ingest state")
+            time.sleep(self.flush_seconds)
+
+# Background flush of the ingest state shared by all requests within the worker process:
+ingest_state_flusher = IngestStateFlusher()
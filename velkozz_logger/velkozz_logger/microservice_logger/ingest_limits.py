@@ -0,0 +1,190 @@
+# Importing native python modules:
+import time
+import random
+import threading
+
+# Importing internal packages:
+from .models import MicroServiceLogDrop
+from .upserts import dialect_insert, upsert_rows
+
+class TokenBucket(object):
+    """A token bucket that refills at 'rate' tokens per second up to a maximum of 'burst' tokens."""
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate, burst, now):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.last = now
+
+    def try_take(self, now):
+        "Method that refills the bucket and takes a single token if one is avalible"
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+
+        return False
+
+class IngestLimiter(object):
+    """The admission control applied to every log posted to the ingest API.
+
+    A log is admitted if it passes the token bucket of its app_name, the token bucket of
+    its (app_name, levelname) and the duplicate sampling of its msg. Identical msgs from an
+    app_name are kept up to a configured number of times per window, after which they are
+    sampled with a fixed probability. All of the state is kept in dicts guarded by a single
+    lock that is only held for a few dict operations, so each decision costs microseconds.
+
+    The token buckets are kept per worker process. So that the configured limits apply to
+    the deployment as a whole, each bucket's rate and burst are divided by 'INGEST_WORKERS',
+    assuming the logs of an app_name are spread evenly across the workers accepting them.
+    The duplicate sampling counts are also per worker, so 'INGEST_DUPLICATE_KEEP' msgs are
+    kept by each worker. Every limit is disabled unless it is set in the app config.
+    """
+    # Reasons for a log being dropped:
+    RATE_LIMITED = "rate_limited"
+    SAMPLED = "sampled"
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._app_buckets = {}
+        self._level_buckets = {}
+        self._duplicates = {}
+        self._window_start = time.time()
+
+        # Default limits, overwritten by the app config in init_app():
+        self.rate_limit = None
+        self.rate_limit_overrides = {}
+        self.level_rate_limits = {}
+        self.duplicate_window_seconds = 60
+        self.duplicate_keep = None
+        self.duplicate_sample_rate = 0.0
+        self.max_tracked_duplicates = 100000
+        self.workers = 1
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        "Method that configures the limits from the flask app config"
+        self.rate_limit = app.config.get("INGEST_RATE_LIMIT", self.rate_limit)
+        self.rate_limit_overrides = app.config.get("INGEST_RATE_LIMIT_OVERRIDES", self.rate_limit_overrides)
+        self.level_rate_limits = app.config.get("INGEST_LEVEL_RATE_LIMITS", self.level_rate_limits)
+        self.duplicate_window_seconds = app.config.get("INGEST_DUPLICATE_WINDOW_SECONDS", self.duplicate_window_seconds)
+        self.duplicate_keep = app.config.get("INGEST_DUPLICATE_KEEP", self.duplicate_keep)
+        self.duplicate_sample_rate = app.config.get("INGEST_DUPLICATE_SAMPLE_RATE", self.duplicate_sample_rate)
+        self.workers = max(int(app.config.get("INGEST_WORKERS", self.workers)), 1)
+
+    def worker_bucket(self, limit, now):
+        "Method that creates the token bucket of this worker's share of a (logs per second, burst) limit"
+        rate, burst = limit
+        return TokenBucket(rate / self.workers, max(burst / self.workers, 1.0), now)
+
+    def admit(self, app_name, levelname, msg):
+        """Method that decides if a log should be written to the database.
+
+        Returns None if the log is admitted, otherwise the reason the log was dropped.
+        """
+        now = time.time()
+
+        with self._lock:
+            # App level rate limit:
+            app_limit = self.rate_limit_overrides.get(app_name, self.rate_limit)
+            if app_limit is not None:
+                bucket = self._app_buckets.get(app_name)
+                if bucket is None:
+                    bucket = self._app_buckets[app_name] = self.worker_bucket(app_limit, now)
+                if not bucket.try_take(now):
+                    return self.RATE_LIMITED
+
+            # Per log level rate limit:
+            level_limit = self.level_rate_limits.get(levelname)
+            if level_limit is not None:
+                key = (app_name, levelname)
+                bucket = self._level_buckets.get(key)
+                if bucket is None:
+                    bucket = self._level_buckets[key] = self.worker_bucket(level_limit, now)
+                if not bucket.try_take(now):
+                    return self.RATE_LIMITED
+
+            # Sampling repeated identical msgs:
+            if self.duplicate_keep is not None:
+                if (now - self._window_start >= self.duplicate_window_seconds or
+                    len(self._duplicates) >= self.max_tracked_duplicates):
+                    self._duplicates = {}
+                    self._window_start = now
+
+                key = (app_name, levelname, msg)
+                occurrences = self._duplicates.get(key, 0) + 1
+                self._duplicates[key] = occurrences
+
+                if occurrences > self.duplicate_keep and random.random() >= self.duplicate_sample_rate:
+                    return self.SAMPLED
+
+        return None
+
+class LogDropCounter(object):
+    """The rollup of the number of logs dropped per app_name, levelname and day.
+
+    Drops are counted in memory and periodically added onto the 'microservice-log-drops'
+    table so that the dashboards can include the dropped logs in their totals.
+    """
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.time()
+        self.flush_seconds = 30
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        "Method that configures the flush interval from the flask app config"
+        self.flush_seconds = app.config.get("INGEST_DROP_FLUSH_SECONDS", self.flush_seconds)
+
+    def record(self, app_name, levelname, created):
+        "Method that counts a dropped log against the day it was created"
+        key = (app_name, levelname, created.date())
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+
+    def flush_if_due(self):
+        "Method that flushes the pending drop counts if the flush interval has passed"
+        if time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Method that adds all of the pending drop counts onto the rollup table.
+
+        The counts are upserted so several workers can add onto the same row at once. The counts
+        that fail to write are put back into the pending counts and retried on the next flush,
+        unless the database rejected them, see upsert_rows().
+        """
+        with self._lock:
+            self._last_flush = time.time()
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+        drop_table = MicroServiceLogDrop.__table__
+        statement = dialect_insert(drop_table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["app_name", "levelname", "date"],
+            set_={"dropped": drop_table.c.dropped + statement.excluded.dropped}
+        )
+
+        retry_rows = upsert_rows(statement, [
+            {"app_name": app_name, "levelname": levelname, "date": date, "dropped": dropped}
+            for (app_name, levelname, date), dropped in pending.items()
+        ], ["app_name", "levelname", "date"])
+
+        with self._lock:
+            for row in retry_rows:
+                key = (row["app_name"], row["levelname"], row["date"])
+                self._pending[key] = self._pending.get(key, 0) + row["dropped"]
+
+# Ingest limiter and drop rollup shared by all requests within the worker process:
+ingest_limiter = IngestLimiter()
+log_drop_counter = LogDropCounter()
@@ -0,0 +1,211 @@
+# Importing native python modules:
+import re
+import time
+import hashlib
+import logging
+import datetime
+import threading
+
+# Importing internal packages:
+from .models import db
+from .log_storage import log_storage
+from .upserts import greatest
+
+logger = logging.getLogger(__name__)
+
+# Patterns for the variable parts of a msg that are masked out of the msg template:
+MSG_TEMPLATE_PATTERNS = [
+    (re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"), "<uuid>"),
+    (re.compile(r"0x[0-9a-fA-F]+"), "<hex>"),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "<str>"),
+    (re.compile(r"\d+(\.\d+)?"), "<num>"),
+    (re.compile(r"\s+"), " ")
+]
+
+def normalize_msg_template(msg):
+    """Method that converts a log msg into a template by masking out uuids, hex values,
+    quoted strings and numbers, so that logs differing only in those values share a template.
+    """
+    if msg is None:
+        return ""
+
+    for pattern, replacement in MSG_TEMPLATE_PATTERNS:
+        msg = pattern.sub(replacement, msg)
+
+    return msg.strip()
+
+def log_fingerprint(app_name, levelname, funcName, lineno, msg):
+    "Method that builds the fingerprint used to identify repeats of the same log"
+    key = "\x1f".join([
+        str(app_name), str(levelname), str(funcName), str(lineno), normalize_msg_template(msg)])
+
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+class LogCollapser(object):
+    """The ingest mode that collapses repeated logs into a single stored row.
+
+    The first log with a given fingerprint is written as a normal row. Repeats within
+    the collapse window of that first log are absorbed in memory and periodically added
+    onto the 'occurrences' and 'last_seen' fields of the stored row. Once the window has
+    passed the next repeat starts a new row, so a long running error storm is stored as
+    one row per window rather than one row per log.
+
+    Each worker process collapses the logs it ingests independently. When the logs are
+    written by the shared log writer a group is opened before its row is committed, so the
+    occurrences of a row that does not exist yet are kept and retried for up to
+    'unmatched_seconds' before they are dropped (eg: the writer dropped the row).
+    """
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._retired = []
+        self._unmatched = {}
+        self._last_flush = time.time()
+
+        # Default params, overwritten by the app config in init_app():
+        self.enabled = False
+        self.window_seconds = 60
+        self.flush_seconds = 5
+        self.unmatched_seconds = 120
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        "Method that configures the collapsing mode from the flask app config"
+        self.enabled = app.config.get("COLLAPSE_DUPLICATE_LOGS", self.enabled)
+        self.window_seconds = app.config.get("COLLAPSE_WINDOW_SECONDS", self.window_seconds)
+        self.flush_seconds = app.config.get("COLLAPSE_FLUSH_SECONDS", self.flush_seconds)
+        self.unmatched_seconds = app.config.get("COLLAPSE_UNMATCHED_SECONDS", self.unmatched_seconds)
+
+    def absorb(self, fingerprint, created):
+        """Method that absorbs a log into the open group of its fingerprint.
+
+        Returns True if the log was absorbed and should not be written to the database,
+        False if the log should be written as a new row and tracked via track().
+        """
+        with self._lock:
+            group = self._groups.get(fingerprint)
+            if group is None or created > group["window_end"] or created < group["created"]:
+                return False
+
+            group["pending"] += 1
+            if created > group["last_seen"]:
+                group["last_seen"] = created
+
+        return True
+
+    def track(self, fingerprint, created, app_name):
+        """Method that opens a new group for a log that has been written to the database.
+
+        The occurrences absorbed by the group it replaces that have not been flushed yet are
+        kept to be added onto the group's row by the next flush.
+        """
+        with self._lock:
+            group = self._groups.get(fingerprint)
+            if group is not None and group["pending"] > 0:
+                self._retired.append(self._group_update(group))
+
+            self._groups[fingerprint] = {
+                "app_name": app_name,
+                "created": created,
+                "last_seen": created,
+                "window_end": created + datetime.timedelta(seconds=self.window_seconds),
+                "pending": 0
+            }
+
+    def flush_if_due(self):
+        "Method that flushes the pending occurrences if the flush interval has passed"
+        if time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def take_updates(self, now=None):
+        """Method that takes the occurrences absorbed since the last flush as a list of
+        (app_name, created, occurrences, last_seen) row updates.
+
+        Groups whose window has closed are dropped from memory once they are taken.
+        """
+        now = datetime.datetime.now() if now is None else now
+
+        with self._lock:
+            self._last_flush = time.time()
+            updates, self._retired = self._retired, []
+            for fingerprint, group in list(self._groups.items()):
+                if group["pending"] > 0:
+                    updates.append(self._group_update(group))
+                    group["pending"] = 0
+                if group["window_end"] < now:
+                    del self._groups[fingerprint]
+
+        return updates
+
+    def flush(self):
+        """Method that adds the occurrences absorbed since the last flush onto the stored rows.
+
+        If the write fails the updates are kept and retried on the next flush. The updates
+        that match no row are kept as well, see retry_unmatched().
+        """
+        updates = self.take_updates()
+        if not updates:
+            return
+
+        unmatched = []
+        try:
+            for update in updates:
+                app_name, created, pending, last_seen = update
+
+                # The row may still be in the main table if it was written before the app was routed:
+                matched_rows = 0
+                for log_model in log_storage.models_for(app_name):
+                    matched_rows += log_model.query.filter_by(created=created, app_name=app_name).update({
+                        log_model.occurrences: log_model.occurrences + pending,
+                        log_model.last_seen: greatest(db.func.coalesce(log_model.last_seen, last_seen), last_seen)
+                    }, synchronize_session=False)
+
+                if matched_rows == 0:
+                    unmatched.append(update)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._retired.extend(updates)
+            raise
+
+        self.retry_unmatched(updates, unmatched)
+
+    def retry_unmatched(self, updates, unmatched, now=None):
+        """Method that keeps the 'unmatched' updates of a flush to be retried on the next flush,
+        as their rows may not have been written by the shared log writer yet.
+
+        The updates of a row that has not been written 'unmatched_seconds' after its first
+        unmatched flush are dropped and logged.
+        """
+        now = time.time() if now is None else now
+        unmatched_keys = {update[:2] for update in unmatched}
+
+        with self._lock:
+            for update in updates:
+                if update[:2] not in unmatched_keys:
+                    self._unmatched.pop(update[:2], None)
+
+            expired_keys = {
+                key for key in unmatched_keys
+                if now - self._unmatched.setdefault(key, now) >= self.unmatched_seconds
+            }
+            for key in expired_keys:
+                del self._unmatched[key]
+
+            self._retired.extend(update for update in unmatched if update[:2] not in expired_keys)
+
+        dropped = sum(update[2] for update in unmatched if update[:2] in expired_keys)
+        if dropped:
+            logger.warning(
+                "Dropped %s collapsed occurrences of logs whose rows were not written within %s seconds",
+                dropped, self.unmatched_seconds)
+
+    def _group_update(self, group):
+        return (group["app_name"], group["created"], group["pending"], group["last_seen"])
+
+# Log collapser shared by all requests within the worker process:
+log_collapser = LogCollapser()
@@ -0,0 +1,305 @@
+# Importing native python modules:
+import re
+import time
+import hashlib
+import logging
+import threading
+
+# Importing SQLAlchemy modules:
+from sqlalchemy import text, table, column, literal, select, union_all
+from sqlalchemy.orm import aliased
+
+# Importing internal packages:
+from .models import MicroServiceLogColumns, MicroServiceLog, Microservice, db
+
+logger = logging.getLogger(__name__)
+
+# The view that unions the main log table w/ every per microservice log table:
+ALL_LOGS_VIEW = "microservice-logs-all"
+
+# The column ranking the logs of a microservice that share a 'created' timestamp across its tables:
+STORAGE_RANK = "storage_rank"
+
+# The names of the per microservice log tables built by service_log_table_name():
+SERVICE_LOG_TABLE_PATTERN = re.compile(r"^microservice-logs-[a-z0-9_]*-[0-9a-f]{8}$")
+
+def service_log_table_name(app_name):
+    """Method that builds the name of the log table of a microservice.
+
+    The name is a slug of the app_name followed by a short hash of it, so distinct app_names
+    never share a table and the table and index names stay within the postgres identifier limit.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "_", app_name.lower()).strip("_")[:20]
+    digest = hashlib.sha1(app_name.encode("utf-8")).hexdigest()[:8]
+
+    return f"microservice-logs-{slug}-{digest}"
+
+def is_service_storage_name(name):
+    "Method that checks if a table name is one of the per microservice log tables or the union view"
+    return name == ALL_LOGS_VIEW or SERVICE_LOG_TABLE_PATTERN.match(name) is not None
+
+def is_missing_table_error(error):
+    "Method that checks if a database error was raised because the table written to does not exist"
+    orig = getattr(error, "orig", error)
+    sqlstate = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+
+    return sqlstate == "42P01" or "no such table" in str(orig)
+
+class LogStorageRouter(object):
+    """The routing of microservice logs to the tables they are stored in.
+
+    With the default 'shared' LOG_STORAGE_LAYOUT every log is stored in the main
+    'microservice-logs' table. With the 'per_service' layout each microservice registered
+    through the creation form gets its own log table, so the write volume and vacuum load of
+    one microservice does not affect the queries of the others. Logs from app_names that are
+    not registered are still stored in the main table, and cross-service queries read the
+    'microservice-logs-all' view that unions the main table w/ every per microservice table.
+
+    The set of registered microservices is cached and refreshed on an interval so the ingest
+    path never queries it. Until a worker refreshes, the logs of a microservice registered
+    through another worker are still stored in the main table, and a write to the table of a
+    microservice removed through another worker falls back to the main table. The reads of a
+    single microservice therefore union its table w/ its rows in the main table. The per
+    microservice layout is only supported on postgres.
+    """
+    SHARED = "shared"
+    PER_SERVICE = "per_service"
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._services = None
+        self._last_refresh = 0.0
+
+        # Default params, overwritten by the app config in init_app():
+        self.layout = self.SHARED
+        self.refresh_seconds = 30
+        self.archive_schema = "log_archive"
+        self.archive_on_remove = True
+
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def per_service(self):
+        return self.layout == self.PER_SERVICE
+
+    def init_app(self, app):
+        "Method that configures the storage layout from the flask app config"
+        self.layout = app.config.get("LOG_STORAGE_LAYOUT", self.layout)
+        self.refresh_seconds = app.config.get("LOG_STORAGE_REFRESH_SECONDS", self.refresh_seconds)
+        self.archive_schema = app.config.get("LOG_STORAGE_ARCHIVE_SCHEMA", self.archive_schema)
+        self.archive_on_remove = app.config.get("LOG_STORAGE_ARCHIVE_ON_REMOVE", self.archive_on_remove)
+
+    def service_model(self, app_name):
+        "Method that returns the ORM model mapped to the log table of a microservice, creating it once"
+        with self._lock:
+            model = self._models.get(app_name)
+            if model is None:
+                table_name = service_log_table_name(app_name)
+                model = self._models[app_name] = type(
+                    f"MicroServiceLog_{table_name.replace('-', '_')}",
+                    (MicroServiceLogColumns, db.Model),
+                    {"__tablename__": table_name}
+                )
+
+        return model
+
+    def registered_services(self):
+        "Method that queries the names of every registered microservice"
+        return {
+            microservice_name for (microservice_name,) in db.session.query(Microservice.microservice_name).all()}
+
+    def refresh_if_due(self):
+        """Method that reloads the set of registered microservices once the refresh interval has passed.
+
+        If the set has changed (eg: a microservice was registered through another worker) the
+        missing log tables are created and the union view is rebuilt.
+        """
+        if not self.per_service or time.time() - self._last_refresh < self.refresh_seconds:
+            return
+
+        self.refresh()
+
+    def refresh(self):
+        "Method that reloads the set of registered microservices, syncing their log tables if it has changed"
+        self._last_refresh = time.time()
+        service_names = self.registered_services()
+        if service_names != self._services:
+            try:
+                self.sync_service_storage(service_names)
+            except Exception:
+                # Retrying on the next refresh, eg: another worker was syncing the same tables:
+                # The logs keep being routed by the previous set, which only names tables that exist:
+                logger.exception("Error syncing the per microservice log tables")
+                return
+        self._services = service_names
+
+    def sync_service_storage(self, service_names):
+        "Method that creates any missing log tables of 'service_names' and rebuilds the union view over them"
+        try:
+            connection = db.session.connection()
+            for app_name in service_names:
+                self.service_model(app_name).__table__.create(connection, checkfirst=True)
+            self.refresh_union_view(service_names)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def model_for(self, app_name, refresh=True):
+        """Method that returns the ORM model of the table the logs of an app_name are written to.
+
+        If the registered microservices have not been loaded yet they are queried, unless
+        'refresh' is False (eg: on the event loop) in which case the main table is used.
+        """
+        if not self.per_service:
+            return MicroServiceLog
+
+        if self._services is None and refresh:
+            self.refresh()
+
+        if self._services and app_name in self._services:
+            return self.service_model(app_name)
+
+        return MicroServiceLog
+
+    def table_for(self, app_name, refresh=True):
+        "Method that returns the table the logs of an app_name are written to"
+        return self.model_for(app_name, refresh).__table__
+
+    def models_for(self, app_name):
+        "Method that returns the ORM models of every table that may contain logs of an app_name"
+        log_model = self.model_for(app_name)
+        if log_model is MicroServiceLog:
+            return [MicroServiceLog]
+
+        return [log_model, MicroServiceLog]
+
+    def service_logs_table(self, app_name, ranked=False):
+        """Method that returns a selectable of every log of an app_name.
+
+        In the per microservice layout this is the microservice's table unioned w/ its rows in
+        the main table, which were written before every worker had routed it to its own table.
+        A microservice that is not cached as registered is refreshed first, as it may have been
+        registered through another worker.
+
+        'created' is only unique within a single table, so if 'ranked' is set the selectable has
+        an extra STORAGE_RANK column that is distinct for each table, making (created, STORAGE_RANK)
+        unique, eg: for a keyset cursor.
+        """
+        main_table = MicroServiceLog.__table__
+        service_table = None
+        if self.per_service:
+            if self._services is None or app_name not in self._services:
+                self.refresh()
+
+            log_model = self.model_for(app_name)
+            if log_model is not MicroServiceLog:
+                service_table = log_model.__table__
+
+        def table_columns(log_table, rank):
+            if ranked:
+                return [*log_table.columns, literal(rank).label(STORAGE_RANK)]
+            return list(log_table.columns)
+
+        if service_table is None:
+            if not ranked:
+                return main_table
+            return select(*table_columns(main_table, 0)).subquery("microservice_logs")
+
+        return union_all(
+            select(*table_columns(service_table, 1)),
+            select(*table_columns(main_table, 0)).where(main_table.c.app_name == app_name)
+        ).subquery("microservice_logs")
+
+    def service_logs(self, app_name):
+        "Method that returns the ORM entity used to query the logs of a single microservice"
+        if not self.per_service:
+            return MicroServiceLog
+
+        return aliased(MicroServiceLog, self.service_logs_table(app_name), adapt_on_names=True)
+
+    def falls_back_to_main_table(self, log_table, app_name, error):
+        """Method that checks if a failed write of an app_name's logs to 'log_table' should be retried in the main table.
+
+        This is the case when the table no longer exists, eg: the microservice was removed through
+        another worker. The app_name is then routed to the main table until the next refresh.
+        """
+        if log_table is MicroServiceLog.__table__ or not is_missing_table_error(error):
+            return False
+
+        logger.warning("The log table of %s no longer exists, writing its logs to the main table", app_name)
+        if self._services:
+            self._services = self._services - {app_name}
+        self._last_refresh = 0.0
+
+        return True
+
+    def all_logs(self):
+        "Method that returns the ORM entity used to query the logs of every microservice"
+        if not self.per_service:
+            return MicroServiceLog
+
+        return aliased(MicroServiceLog, self.all_logs_table(), adapt_on_names=True)
+
+    def all_logs_table(self):
+        "Method that returns the table (or union view) containing the logs of every microservice"
+        if not self.per_service:
+            return MicroServiceLog.__table__
+
+        return table(ALL_LOGS_VIEW, *[
+            column(log_column.name, log_column.type) for log_column in MicroServiceLog.__table__.columns])
+
+    def refresh_union_view(self, service_names):
+        "Method that recreates the view unioning the main log table w/ the log tables of 'service_names'"
+        columns = ", ".join(f'"{column.name}"' for column in MicroServiceLog.__table__.columns)
+        tables = [MicroServiceLog.__tablename__] + [
+            service_log_table_name(app_name) for app_name in sorted(service_names)]
+        union = " UNION ALL ".join(f'SELECT {columns} FROM "{table}"' for table in tables)
+
+        db.session.execute(text(f'CREATE OR REPLACE VIEW "{ALL_LOGS_VIEW}" AS {union}'))
+
+    def create_service_storage(self, app_name):
+        "Method that creates the log table of a newly registered microservice and adds it to the union view"
+        if not self.per_service:
+            return
+
+        service_names = self.registered_services() | {app_name}
+        self.sync_service_storage(service_names)
+        self._services = service_names
+
+    def remove_service_storage(self, app_name):
+        """Method that removes the log table of a microservice that is being deleted.
+
+        The table is dropped, or if 'LOG_STORAGE_ARCHIVE_ON_REMOVE' is set, renamed w/ a timestamp
+        and moved into the archive schema along w/ its indexes so the microservice can be registered
+        again w/o any name conflicts.
+        """
+        if not self.per_service:
+            return
+
+        model = self.service_model(app_name)
+        table_name = model.__tablename__
+        service_names = self.registered_services() - {app_name}
+
+        # Removing the table from the view before it is dropped or moved:
+        self.refresh_union_view(service_names)
+
+        if self.archive_on_remove:
+            suffix = int(time.time())
+            index_names = [f"{table_name}_pkey"] + [index.name for index in model.__table__.indexes]
+            for position, index_name in enumerate(index_names):
+                db.session.execute(text(
+                    f'ALTER INDEX IF EXISTS "{index_name}" RENAME TO "{index_name[:40]}_{suffix}_{position}"'))
+            db.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{self.archive_schema}"'))
+            db.session.execute(text(f'ALTER TABLE IF EXISTS "{table_name}" RENAME TO "{table_name}_{suffix}"'))
+            db.session.execute(text(f'ALTER TABLE IF EXISTS "{table_name}_{suffix}" SET SCHEMA "{self.archive_schema}"'))
+        else:
+            db.session.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+
+        db.session.commit()
+        self._services = service_names
+
+# Log storage router shared by all requests within the worker process:
+log_storage = LogStorageRouter()
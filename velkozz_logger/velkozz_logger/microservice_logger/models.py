@@ -1,10 +1,8 @@
 # Importing Project Objects:
 from .. import db
 
-# Genetic Log Data Model: 
-class MicroServiceLog(db.Model):
-
-    __tablename__ = "microservice-logs"
+# Columns of a log table, shared by the main log table and the per microservice log tables:
+class MicroServiceLogColumns(object):
 
     name = db.Column(
         db.String(100),
@@ -53,7 +51,7 @@ class MicroServiceLog(db.Model):
         primary_key=True,
         index=True,
         unique=False,
-        nullable=True
+        nullable=False
     )
     
     lineno = db.Column(
@@ -112,9 +110,42 @@ class MicroServiceLog(db.Model):
         nullable=True
     )
 
+    # Fields populated when duplicate logs are collapsed into a single row, 'created' is the first seen:
+    fingerprint = db.Column(
+        db.String(40),
+        index=True,
+        unique=False,
+        nullable=True
+    )
+
+    last_seen = db.Column(
+        db.TIMESTAMP,
+        index=False,
+        unique=False,
+        nullable=True
+    )
+
+    occurrences = db.Column(
+        db.Integer,
+        index=False,
+        unique=False,
+        nullable=False,
+        default=1,
+        server_default="1"
+    )
+
     def __repr__(self): 
         return f"{self.app_name}{self.processName}{self.timestamp}"
 
+# Genetic Log Data Model: 
+class MicroServiceLog(MicroServiceLogColumns, db.Model):
+
+    __tablename__ = "microservice-logs"
+    __table_args__ = (
+        # Serves the per microservice dashboard, daily log and export queries:
+        db.Index("ix_microservice-logs_app_name_created", "app_name", "created"),
+    )
+
 # Microservice Objects:
 class Microservice(db.Model):
 
@@ -139,3 +170,137 @@ class Microservice(db.Model):
 
     def __repr__(self): 
         return f"{self.microservice_name}"
+
+# Microservice Heartbeat Objects:
+class MicroserviceHeartbeat(db.Model):
+
+    __tablename__ = "microservice-heartbeats"
+
+    app_name = db.Column(
+        db.String(100),
+        primary_key=True
+    )
+
+    # The log level of the heartbeat, '*' is the last log made at any level:
+    levelname = db.Column(
+        db.String(100),
+        primary_key=True
+    )
+
+    last_seen = db.Column(
+        db.TIMESTAMP,
+        index=False,
+        unique=False,
+        nullable=False
+    )
+
+    def __repr__(self): 
+        return f"{self.app_name}{self.levelname}{self.last_seen}"
+
+# Rollup of the logs dropped by ingest rate limiting and sampling:
+class MicroServiceLogDrop(db.Model):
+
+    __tablename__ = "microservice-log-drops"
+
+    app_name = db.Column(
+        db.String(100),
+        primary_key=True
+    )
+
+    levelname = db.Column(
+        db.String(100),
+        primary_key=True
+    )
+
+    date = db.Column(
+        db.Date,
+        primary_key=True
+    )
+
+    dropped = db.Column(
+        db.Integer,
+        index=False,
+        unique=False,
+        nullable=False,
+        default=0
+    )
+
+    def __repr__(self): 
+        return f"{self.app_name}{self.levelname}{self.date}"
+
+# Log counts per time bucket, shared by the anomaly detectors of every worker:
+class MicroServiceLogRate(db.Model):
+
+    __tablename__ = "microservice-log-rates"
+    __table_args__ = (
+        # Serves the reads of recent buckets and the pruning of old buckets:
+        db.Index("ix_microservice-log-rates_bucket_start", "bucket_start"),
+    )
+
+    app_name = db.Column(
+        db.String(100),
+        primary_key=True
+    )
+
+    # The log level of the count, '*' is the count of logs made at any level:
+    levelname = db.Column(
+        db.String(100),
+        primary_key=True
+    )
+
+    bucket_start = db.Column(
+        db.TIMESTAMP,
+        primary_key=True
+    )
+
+    count = db.Column(
+        db.Integer,
+        index=False,
+        unique=False,
+        nullable=False,
+        default=0
+    )
+
+    def __repr__(self): 
+        return f"{self.app_name}{self.levelname}{self.bucket_start}"
+
+# Precomputed weekly summary of the logs made by each microservice:
+class MicroserviceSummary(db.Model):
+
+    __tablename__ = "microservice-summaries"
+
+    app_name = db.Column(
+        db.String(100),
+        primary_key=True
+    )
+
+    info_count = db.Column(db.Integer, nullable=False, default=0)
+    warning_count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    critical_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Share of the week's logs that were ERROR or CRITICAL:
+    error_ratio = db.Column(
+        db.Float,
+        nullable=False,
+        default=0.0
+    )
+
+    last_seen = db.Column(
+        db.TIMESTAMP,
+        nullable=True
+    )
+
+    # JSON of the daily counts per level: {"dates": [...], "INFO": [...], ...}
+    daily_counts = db.Column(
+        db.Text,
+        nullable=False
+    )
+
+    refreshed_at = db.Column(
+        db.TIMESTAMP,
+        nullable=False
+    )
+
+    def __repr__(self): 
+        return f"{self.app_name}{self.refreshed_at}"
@@ -1,12 +1,11 @@
 # Importing Flask modules: 
-from flask import Blueprint, make_response, render_template, flash, redirect
+from flask import Blueprint, Response, make_response, render_template, flash, redirect, stream_with_context
 from flask import current_app as app
 
 # Importing Flask REST API modules:
 from flask_restful import Resource, reqparse, Api
 
 # Importing 3rd party packages:
-import ast
 import json
 import datetime
 import networkx as nx
@@ -14,9 +13,20 @@ import plotly
 import plotly.graph_objects as go
 import pandas as pd
 
+# Importing SQLAlchemy modules:
+from sqlalchemy.orm import aliased
+
 # Importing internal packages: 
-from .models import MicroServiceLog, Microservice, db
+from .models import MicroServiceLog, Microservice, MicroServiceLogDrop, MicroserviceSummary, db
 from .forms import MicroserviceCreationForm
+from .anomaly_detection import log_rate_detector
+from .heartbeats import heartbeat_tracker
+from .summaries import summary_refresher, refresh_microservice_summaries
+from .log_storage import log_storage, STORAGE_RANK
+from .exports import EXPORTERS, EXPORT_CONTENT_TYPES, build_export_query, stream_log_rows, parquet_available
+from .ingest import (
+    build_log_record, screen_log_record, store_log_record, track_stored_record, flush_ingest_state,
+    ingest_state_flusher)
 
 # Blueprint Configuration:
 microservice_bp = Blueprint(
@@ -28,6 +38,11 @@ microservice_bp = Blueprint(
 # Creating API:
 api = Api(microservice_bp)
 
+# Starting the background flush of the ingest state on the first request of each worker:
+@microservice_bp.before_app_request
+def start_ingest_state_flusher():
+    ingest_state_flusher.start(app._get_current_object())
+
 # Creating the request parser object for all python logging field:
 log_parser = reqparse.RequestParser()
 log_parser.add_argument("name")
@@ -59,7 +74,7 @@ class MicroServiceLogs(Resource):
         TODO: Add URL query param support.
         """
         # Querying all logs made from the database:
-        logs = MicroServiceLog.query.all()
+        logs = db.session.query(log_storage.all_logs()).all()
 
         # Unpacking the SQLAlchemy objects into seralized JSON:
         logs = [
@@ -78,7 +93,9 @@ class MicroServiceLogs(Resource):
                 "thread":log.thread,
                 "threadName":log.threadName,
                 "processName":log.processName,
-                "process":log.process
+                "process":log.process,
+                "last_seen":log.last_seen.strftime("%m/%d/%Y, %H:%M:%S") if log.last_seen is not None else None,
+                "occurrences":log.occurrences
             }
              for log in logs
              ]
@@ -94,57 +111,213 @@ class MicroServiceLogs(Resource):
         SQLA objects that are written to the database. 
         """
         
-        # Extracting all log params:
+        # Extracting all log params and converting them to a log record:
         args = log_parser.parse_args()
+        try:
+            record = build_log_record(args)
+        except (Warning, ValueError, TypeError, SyntaxError) as error:
+            return make_response(f"Log not Written to the database: {error}", 400)
+        log_label = f"Log {record['app_name']}{record['process_type']}{record['created']}"
+
+        # Running the log through the rate limits, sampling and duplicate collapsing:
+        outcome = screen_log_record(record)
+        if outcome is not None:
+            flush_ingest_state()
+            return make_response(f"{log_label} Not Stored: {outcome}", 202)
+
+        # Commiting a Log Object to the database:
+        store_log_record(record)
+
+        track_stored_record(record)
+        flush_ingest_state()
+        
+        return make_response(f"{log_label} Successfully")
 
-        if {
-            'args', 'created', 'lineno', 'msecs', 'relativeCreated', 
-            'thread', 'name', 'msg', 'levelname', 'funcName', 'threadName',
-            'processName', 'process'
-            } <= set(args):
-
-            # Converting the string tuple to actual tuple and unpacking:
-            app_name, process_type, status_code = ast.literal_eval(args["args"])
-
-            # Converting the arguments to the correct data types:
-            status_code = int(status_code)
-            created_obj = datetime.datetime.fromtimestamp(float(args["created"]))
-            lineno = int(args["lineno"])
-            msecs = float(args["msecs"])
-            relativeCreated = datetime.datetime.fromtimestamp(float(args["relativeCreated"]))
-            thead = int(args["thread"])
-            
-            # Creating Log w/ ORM object:
-            new_log = MicroServiceLog(
-                name = args["name"],
-                msg = args["msg"],
-                app_name = app_name,
-                process_type = process_type,
-                status_code = status_code,
-                levelname = args["levelname"],
-                created = created_obj,
-                lineno = lineno,
-                funcName = args["funcName"],
-                msecs = msecs,
-                relativeCreated = relativeCreated,
-                thread = thead,
-                threadName = args["threadName"],
-                processName = args["processName"],
-                process = args["process"]
-            )
-                        
-            # Commiting a Log Object to the database:
-            db.session.add(new_log)
-            db.session.commit() 
-            
-            return make_response(f"Log {app_name}{process_type}{created_obj} Successfully")
+# Creating the request parser for the query params of the daily log pages:
+daily_log_parser = reqparse.RequestParser()
+daily_log_parser.add_argument("cursor", location="args")
+daily_log_parser.add_argument("limit", type=int, default=100, location="args")
+daily_log_parser.add_argument("level", location="args")
+daily_log_parser.add_argument("q", location="args")
 
+class DailyMicroServiceLogs(Resource):
+    """The REST API function for paging through the logs made by a microservice on a single day.
+
+    GET - Returns a page of logs ordered newest first along with the cursor for the next page.
+    
+    The logs are paginated with a keyset cursor on the 'created' primary key and the storage
+    rank of the table the log is in (as 'created' is only unique within one table), so that the
+    cost of each page is independent of how far into the day it is. Logs can be filtered by a comma
+    seperated list of log levels ('level') and a case insensitive search of the msg ('q').
+    """
+    max_limit = 1000
+
+    def get(self, microservice, date):
+        args = daily_log_parser.parse_args()
+        limit = min(max(args["limit"], 1), self.max_limit)
+
+        # Converting the date string to the timestamp range of the day:
+        try:
+            day = datetime.datetime.strptime(date, "%d-%m-%Y")
+        except ValueError:
+            return {"message": "The date must be formatted as DD-MM-YYYY"}, 400
+        min_timestamp = datetime.datetime.combine(day, datetime.time.min)
+        max_timestamp = datetime.datetime.combine(day, datetime.time.max)
+
+        # Querying the tables the microservice's logs are stored in:
+        log_table = log_storage.service_logs_table(microservice, ranked=True)
+        log_model = aliased(MicroServiceLog, log_table, adapt_on_names=True)
+        storage_rank = log_table.c[STORAGE_RANK]
+
+        # Continuing from the last log of the previous page, the cursor is '<created>,<storage rank>':
+        if args["cursor"]:
+            try:
+                cursor_created, _, cursor_rank = args["cursor"].partition(",")
+                cursor_created = datetime.datetime.fromisoformat(cursor_created)
+                cursor_rank = int(cursor_rank) if cursor_rank else None
+            except ValueError:
+                return {"message": "'cursor' must be an ISO 8601 timestamp followed by ',<storage rank>'"}, 400
+
+            created_filter = log_model.created < cursor_created
+            if cursor_rank is not None:
+                created_filter = db.or_(created_filter, db.and_(
+                    log_model.created == cursor_created, storage_rank < cursor_rank))
         else:
-            raise Warning("Log not Written to the database. Placeholder for error catching.")
-            pass
+            created_filter = log_model.created <= max_timestamp
+
+        log_query = db.session.query(log_model, storage_rank).filter(
+            log_model.app_name == microservice).filter(
+                log_model.created >= min_timestamp).filter(
+                created_filter)
+
+        if args["level"]:
+            log_query = log_query.filter(log_model.levelname.in_(args["level"].split(",")))
+        
+        if args["q"]:
+            log_query = log_query.filter(
+                db.func.lower(log_model.msg).contains(args["q"].lower(), autoescape=True))
+
+        # Querying one extra log to determine if there is a next page:
+        logs = log_query.order_by(log_model.created.desc(), storage_rank.desc()).limit(limit + 1).all()
+        if len(logs) > limit:
+            last_log, last_rank = logs[limit - 1]
+            next_cursor = f"{last_log.created.isoformat()},{last_rank}"
+        else:
+            next_cursor = None
+
+        return {
+            "logs": [
+                {
+                    "created":log.created.isoformat(),
+                    "levelname":log.levelname,
+                    "status_code":log.status_code,
+                    "funcName":log.funcName,
+                    "lineno":log.lineno,
+                    "msg":log.msg,
+                    "occurrences":log.occurrences or 1,
+                    "last_seen":log.last_seen.isoformat() if log.last_seen is not None else None
+                }
+                for log, _ in logs[:limit]
+            ],
+            "next_cursor": next_cursor
+        }
+
+# Creating the request parser for the query params of log exports:
+export_parser = reqparse.RequestParser()
+export_parser.add_argument("format", default="ndjson", choices=list(EXPORTERS), location="args")
+export_parser.add_argument("app_name", location="args")
+export_parser.add_argument("level", location="args")
+export_parser.add_argument("start", location="args")
+export_parser.add_argument("end", location="args")
+export_parser.add_argument("chunk_size", type=int, default=5000, location="args")
+
+class MicroServiceLogExport(Resource):
+    """The REST API function for bulk extraction of microservice logs.
+
+    GET - Streams every log matching the query params as CSV, NDJSON or Parquet.
+
+    The logs can be filtered by 'app_name', a comma seperated list of levels ('level') and an
+    ISO 8601 'start'/'end' range on the created timestamp. They are read from a server side
+    cursor in chunks of 'chunk_size' rows and written to the response as each chunk is
+    serialized, so exports of any size run in constant memory. All timestamps are exported in
+    ISO 8601 w/ full precision.
+    """
+    max_chunk_size = 50000
+
+    def get(self):
+        args = export_parser.parse_args()
+        export_format = args["format"]
+
+        if export_format == "parquet" and not parquet_available():
+            return {"message": "Parquet exports require the pyarrow package to be installed"}, 400
+
+        try:
+            start = datetime.datetime.fromisoformat(args["start"]) if args["start"] else None
+            end = datetime.datetime.fromisoformat(args["end"]) if args["end"] else None
+        except ValueError:
+            return {"message": "'start' and 'end' must be ISO 8601 timestamps"}, 400
+
+        log_table = log_storage.service_logs_table(args["app_name"]) if args["app_name"] else log_storage.all_logs_table()
+        query = build_export_query(
+            log_table,
+            app_name=args["app_name"],
+            levels=args["level"].split(",") if args["level"] else None,
+            start=start,
+            end=end
+        )
+        columns = [column.name for column in MicroServiceLog.__table__.columns]
+        chunk_size = min(max(args["chunk_size"], 1), self.max_chunk_size)
+
+        chunks = stream_log_rows(query, chunk_size)
+        response = Response(
+            stream_with_context(EXPORTERS[export_format](columns, chunks)), 
+            mimetype=EXPORT_CONTENT_TYPES[export_format])
+        response.headers["Content-Disposition"] = f"attachment; filename=microservice_logs.{export_format}"
+
+        return response
+
+# Command for refreshing the microservice summaries from a scheduler (eg: cron):
+@microservice_bp.cli.command("refresh-summaries")
+def refresh_summaries_command():
+    "Refreshes the precomputed weekly microservice summaries shown on the home page."
+    if not refresh_microservice_summaries():
+        print("Summaries are being refreshed by another process, skipped")
 
 # Registering Microservice Log Routes:
 api.add_resource(MicroServiceLogs, "/api/")
+api.add_resource(DailyMicroServiceLogs, "/api/<microservice>/<date>/")
+api.add_resource(MicroServiceLogExport, "/api/export/")
+
+def build_staleness(heartbeats):
+    """Method that converts the heartbeat index into a dict of the time since each app_name
+    last logged, overall and per log level, formatted for display.
+    """
+    now = datetime.datetime.now()
+
+    def format_delta(last_seen):
+        seconds = max(int((now - last_seen).total_seconds()), 0)
+        if seconds < 60:
+            return f"{seconds}s ago"
+        elif seconds < 3600:
+            return f"{seconds // 60}m ago"
+        elif seconds < 86400:
+            return f"{seconds // 3600}h ago"
+        else:
+            return f"{seconds // 86400}d ago"
+
+    staleness = {}
+    for app_name, levels in heartbeats.items():
+        last_seen = levels.get(heartbeat_tracker.ALL_LEVELS)
+        staleness[app_name] = {
+            "last_seen": last_seen,
+            "stale_for": format_delta(last_seen) if last_seen is not None else None,
+            "levels": {
+                level: format_delta(level_last_seen) for level, level_last_seen in sorted(levels.items())
+                if level != heartbeat_tracker.ALL_LEVELS
+            }
+        }
+
+    return staleness
 
 # Non REST API Routes:
 @microservice_bp.route("/", methods=["GET"])
@@ -153,6 +326,18 @@ def microservice_log_home():
     # Querying the Microservice objects:
     microservices = Microservice.query.all()
 
+    # Extracting the log rate anomalies currently flagged by the detector:
+    anomalies = log_rate_detector.flags(
+        [microservice.microservice_name for microservice in microservices])
+
+    # Building the staleness of each microservice from the heartbeat index:
+    staleness = build_staleness(heartbeat_tracker.heartbeats())
+    registered_names = {microservice.microservice_name for microservice in microservices}
+    unregistered = {
+        app_name: app_staleness for app_name, app_staleness in staleness.items() 
+        if app_name not in registered_names
+    }
+
     # Creating the graph plot from all the microservices:
     microservice_G = nx.Graph()
     microservice_G.add_node("Velkozz_REST_API") # Central node for the graph, the velkozz REST API.
@@ -250,154 +435,32 @@ def microservice_log_home():
     # Converting the plotly graph to a JSON object to be passed to the frontend:
     graphJSON = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
 
-    # TODO: Filter the logs sent by microservices.
-    # Create line graphs of all of the microservices sent per microservice.
-    # Querying all microservice logs:
-
-    # Creating the previous week timeframe that is used to filter the microservice logs:
-    prev_week = datetime.datetime.today() - datetime.timedelta(days=7)
-    microservice_logs = MicroServiceLog.query.filter(MicroServiceLog.created >= prev_week).all()
+    # Reading the precomputed weekly summaries, they are refreshed in the background:
+    summary_refresher.start(app._get_current_object())
+    summaries = {
+        summary.app_name: summary for summary in MicroserviceSummary.query.filter(
+            MicroserviceSummary.app_name.in_(registered_names)).all()
+    }
+
+    # Formatting the timeseries titles without modifying the microservice objects:
+    timeseries_titles = {
+        microservice.microservice_name: format_timeseries_title(microservice.microservice_description)
+        for microservice in microservices
+    }
     
-    # Logic that checks the number of microservice_logs. If < 0 render template w/o applying logic:
-    if len(microservice_logs) <= 0:
-        return render_template("microservice_home.html", microservices=microservices, graphJSON=graphJSON)
-
-    # Converting the microservice query object to a list of dictionary:
-    microservice_log_dicts = [
-        {
-            "name":microservice_log.name,
-            "msg":microservice_log.msg, 
-            "app_name":microservice_log.app_name,
-            "process_type":microservice_log.process_type,
-            "status_code":microservice_log.status_code, 
-            "levelname":microservice_log.levelname,
-            "created":microservice_log.created,
-            "lineno":microservice_log.lineno,
-            "funcName":microservice_log.funcName, 
-            "msecs":microservice_log.msecs,
-            "relativeCreated":microservice_log.relativeCreated,
-            "thread":microservice_log.thread,
-            "threadName":microservice_log.threadName, 
-            "processName":microservice_log.processName,
-            "process":microservice_log.process
-
-        } for microservice_log in microservice_logs
-    ]
-
-    microservice_df = pd.DataFrame.from_dict(microservice_log_dicts)
-    microservice_df["_counter"] = 1 
-
-    # Slicing dataframes based on specific microservices:
-    microservice_slices = {}
-    for microservice in microservices:
-        
-        # Slicing dataframe:
-        df_slice = microservice_df.loc[microservice_df["app_name"] == microservice.microservice_name]
+    return render_template("microservice_home.html", microservices=microservices, graphJSON=graphJSON, anomalies=anomalies, 
+            staleness=staleness, unregistered=unregistered, summaries=summaries, timeseries_titles=timeseries_titles)
 
-        # Transforming data to create daily frequency counts:
-        df_slice.set_index("created" ,inplace=True)
-        
-        def add_microservice_log_data(microservice_slice_dict, microservice_name, microservice_df):
-            """Method tries to extract the number of daily occurances of the specific 
-            log level from the dataframe.
-
-            It extracts this data, seralizes it and adds the seralized data to the main 
-            'microservice_slices' dict.
-            """
-            # List of log level to process:
-            levels = ["INFO", "WARN", "ERR.", "CRITICAL", "WARNING", "ERROR"]
-
-            # Iterating through the dataframe slicing and resampling data to get counts of logs:
-            level_data_dict = {}
-            for level in levels:
-                try:
-                    level_slice = df_slice.loc[df_slice["levelname"] == level, "_counter"].squeeze().resample("D").sum()
-                except:
-                    level_slice = None
-
-                if level_slice is not None:
-                    
-                    # Building nested dict for the specfici log level data:
-                    level_data_dict[level] = {
-                        "Date_Index":level_slice.index,
-                        "Data": list(level_slice.values)
-                    }
-                else:
-                    pass
-            
-            # Add the level_data_dict onto the main microservice slice dict:
-            microservice_slice_dict[microservice_name] = level_data_dict
+def format_timeseries_title(description, words_per_line=10):
+    "Method that inserts a line break into long microservice descriptions so they fit a plot title"
+    if description is None:
+        return ""
 
-        add_microservice_log_data(microservice_slices, microservice, df_slice)
+    description_lst = description.split(" ")
+    if len(description_lst) > words_per_line - 1:
+        description_lst.insert(words_per_line, "<br>")
 
-    # TODO: use Microservice Slice Dict to create plotly timesereis and pass them to the front-end.
-    # Iterating through the microservice dict to create a plotly timeseries for each microservice:
-    levels = ["INFO", "WARN", "ERR.", "CRITICAL", "WARNING", "ERROR"]
-    log_scatterplots = {}
-    for microservice in microservice_slices:   
-
-        microservice_desc_lst = microservice.microservice_description.split(" ")
-        # Splitting microservice description to make it formattable:
-        if len(microservice_desc_lst) > 9:
-
-            # Inserting line breaks:
-            microservice_desc_lst.insert(10, "<br>")
-
-            # Re-converting the list of strigs to a single string and adding it back to the microservice objects:
-            microservice.microservice_description = " ".join(microservice_desc_lst)
-
-        microservice_fig = go.Figure(
-            layout=go.Layout(
-                title=dict(
-                    text=microservice.microservice_description,
-                    y=0.9,
-                    x=0.5,
-                    xanchor="center",
-                    yanchor="top"
-                ),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="#b2becd"),
-                xaxis=dict(
-                    title="Local Time",
-                    gridcolor="#b2becd",
-                    linecolor="#b2becd",
-                    linewidth= 1,
-                    mirror= True, 
-                    showgrid=False),
-                yaxis=dict(
-                    title="Log Frequency",
-                    gridcolor= "#b2becd",
-                    linecolor= "#b2becd",
-                    linewidth= 2,
-                    mirror= True,
-                    showgrid= False)
-            )
-        )
-        
-        # Iterating over the logging levels to add traces to the main figure:
-        for level in levels:
-            try:
-                microservice_fig.add_trace(go.Scatter(
-                    name=f"{level}",
-                    mode="markers+lines",
-                    x=microservice_slices[microservice][level]["Date_Index"],
-                    y=microservice_slices[microservice][level]["Data"]
-                    
-                ))
-                
-            except:
-                pass
-        
-        # Adding the built figure to the scatterplot dict:
-        
-        log_scatterplots[microservice] = json.dumps(microservice_fig, cls=plotly.utils.PlotlyJSONEncoder)
-    
-    # Now that all scatterplots have been built adding the searlized data to the microservice query objects:
-    for microservice in microservices:
-        microservice.timeseries = log_scatterplots[microservice]
-    
-    return render_template("microservice_home.html", microservices=microservices, graphJSON=graphJSON)
+    return " ".join(description_lst)
 
 # Route to delete microservice object:
 @microservice_bp.route("/remove/<microservice>")
@@ -410,9 +473,13 @@ def remove_microservice(microservice):
     if microservice is not None:
         # Deleting Miroservice:
         msg_text = f"Microservice {microservice.microservice_name} successfully removed"
+        microservice_name = microservice.microservice_name
         db.session.delete(microservice)
         db.session.commit()
 
+        # Dropping or archiving the microservice's log table in the per microservice storage layout:
+        log_storage.remove_service_storage(microservice_name)
+
         flash(msg_text)
 
         return redirect("/")
@@ -455,6 +522,9 @@ def microservice_creation_form():
             db.session.add(new_microservice)
             db.session.commit()
 
+            # Creating the microservice's log table in the per microservice storage layout:
+            log_storage.create_service_storage(new_microservice.microservice_name)
+
         return redirect("/microservices/")
 
     return render_template("microservice_creation_form.html", form=form)
@@ -479,9 +549,10 @@ def specific_microservice_dashboard(microservice):
     if microservice is not None:
         
         # Querying the logs from a specific microservice: 
-        microservice_logs = MicroServiceLog.query.filter_by(
-            app_name=microservice.microservice_name).filter(MicroServiceLog.created >= prev_week).order_by(
-                MicroServiceLog.created.desc()).all()
+        log_model = log_storage.service_logs(microservice.microservice_name)
+        microservice_logs = db.session.query(log_model).filter_by(
+            app_name=microservice.microservice_name).filter(log_model.created >= prev_week).order_by(
+                log_model.created.desc()).all()
         
         # Logic rendering template w/o graphs and other dispaly if there are no logs:
         if len(microservice_logs) <= 0:
@@ -504,7 +575,8 @@ def specific_microservice_dashboard(microservice):
                 "thread":microservice_log.thread,
                 "threadName":microservice_log.threadName, 
                 "processName":microservice_log.processName,
-                "process":microservice_log.process
+                "process":microservice_log.process,
+                "occurrences":microservice_log.occurrences or 1
 
             } for microservice_log in microservice_logs
         ]
@@ -512,7 +584,7 @@ def specific_microservice_dashboard(microservice):
         # Creating and refactoring the dataframe into a dialy count of log frequency:
         microservice_df = pd.DataFrame.from_dict(microservice_log_dicts)
         
-        microservice_df["_counter"] = 1
+        microservice_df["_counter"] = microservice_df["occurrences"]
         microservice_df.set_index("created" ,inplace=True)
 
         # Creating a figure for microservice log timeseries based on log severity level:
@@ -584,6 +656,23 @@ def specific_microservice_dashboard(microservice):
         daily_level_count_df.drop("ERR.", axis=1, inplace=True)
         daily_level_count_df.drop("WARN", axis=1, inplace=True)
 
+        # Adding the logs dropped by ingest rate limiting and sampling onto the daily totals:
+        log_drops = MicroServiceLogDrop.query.filter_by(
+            app_name=microservice.microservice_name).filter(
+                MicroServiceLogDrop.date >= prev_week.date()).all()
+
+        daily_level_count_df["DROPPED"] = 0
+        for log_drop in log_drops:
+            drop_day = pd.Timestamp(log_drop.date)
+            drop_level = {"WARN":"WARNING", "ERR.":"ERROR"}.get(log_drop.levelname, log_drop.levelname)
+
+            if drop_day not in daily_level_count_df.index:
+                daily_level_count_df.loc[drop_day] = 0
+            
+            daily_level_count_df.loc[drop_day, "DROPPED"] += log_drop.dropped
+            if drop_level in daily_level_count_df.columns:
+                daily_level_count_df.loc[drop_day, drop_level] += log_drop.dropped
+
         # Creating independent datetime column so index can be replaced:
         daily_level_count_df["Date"] = daily_level_count_df.index
         daily_level_count_df["Date"] = daily_level_count_df["Date"].apply(lambda x: x.strftime("%d-%m-%Y"))
@@ -609,6 +698,8 @@ def daily_microservice_logs(microservice, date):
 
     Whereas specific_microservice_dashboard() renders a summary of all logs made broken
     down by day, this method displays every single log made for that microservice for that day.
+    Only the hourly counts are queried here, the logs are paged into the template from the
+    DailyMicroServiceLogs API as the log table is scrolled.
     """    
     # Converting date string to datetime objects, getting the first and last timestamp of a day:
     # Combining min/max times w/ datetime to create date range query:
@@ -616,43 +707,23 @@ def daily_microservice_logs(microservice, date):
     min_timestamp = datetime.datetime.combine(day, datetime.time.min)
     max_timestamp = datetime.datetime.combine(day, datetime.time.max)
 
-    # Querying all microserivce logs for the date specified:    
-    microservice_logs = MicroServiceLog.query.filter_by(
-        app_name=microservice).filter(
-            MicroServiceLog.created >= min_timestamp).filter(
-            MicroServiceLog.created <= max_timestamp).order_by(
-            MicroServiceLog.created.desc()).all()
-
-    # Creating a dataframe from the microservice_logs every hour (TODO: Re-factor timescale?):
-    
-    # Converting the Microservice Logs to a dataframe:
-    microservice_log_dicts = [
-
-        {
-            "name":microservice_log.name,
-            "msg":microservice_log.msg, 
-            "app_name":microservice_log.app_name,
-            "process_type":microservice_log.process_type,
-            "status_code":microservice_log.status_code, 
-            "levelname":microservice_log.levelname,
-            "created":microservice_log.created,
-            "lineno":microservice_log.lineno,
-            "funcName":microservice_log.funcName, 
-            "msecs":microservice_log.msecs,
-            "relativeCreated":microservice_log.relativeCreated,
-            "thread":microservice_log.thread,
-            "threadName":microservice_log.threadName, 
-            "processName":microservice_log.processName,
-            "process":microservice_log.process
-
-        } for microservice_log in microservice_logs
-    ]
-
-    # Creating and refactoring the dataframe into a dialy count of log frequency:
-    microservice_df = pd.DataFrame.from_dict(microservice_log_dicts)
-        
-    microservice_df["_counter"] = 1
-    microservice_df.set_index("created" ,inplace=True)
+    # Aggregating the hourly log counts per level for the day in the database:
+    log_model = log_storage.service_logs(microservice)
+    log_hour = db.extract("hour", log_model.created).label("log_hour")
+    hourly_counts = db.session.query(
+        log_hour,
+        log_model.levelname,
+        db.func.sum(db.func.coalesce(log_model.occurrences, 1))).filter(
+            log_model.app_name == microservice).filter(
+            log_model.created >= min_timestamp).filter(
+            log_model.created <= max_timestamp).group_by(
+            log_hour, log_model.levelname).all()
+
+    # Building a dense series of hourly counts for each level:
+    hours = [min_timestamp + datetime.timedelta(hours=hour) for hour in range(24)]
+    level_hourly_counts = {}
+    for hour, levelname, count in hourly_counts:
+        level_hourly_counts.setdefault(levelname, [0] * 24)[int(hour)] = int(count)
 
     # Empty Plotly Figure:
     log_level_fig = go.Figure(
@@ -684,23 +755,17 @@ def daily_microservice_logs(microservice, date):
         )
     )
 
-    # Extracting hourly counts of logs and plotting scatterplot:
+    # Plotting the hourly counts of each level that has logs on the day:
     for level in ["INFO", "WARN", "ERR.", "CRITICAL", "WARNING", "ERROR"]:
-        level_frequency = microservice_df.loc[microservice_df["levelname"] == level, "_counter"].squeeze().resample("H").sum()     
-
-        try:
+        if level in level_hourly_counts:
             log_level_fig.add_trace(go.Scatter(
                 name=f"{level}",
                 mode="markers+lines",
-                x=level_frequency.index,
-                y=list(level_frequency.values)
+                x=hours,
+                y=level_hourly_counts[level]
             ))
 
-        except:
-            pass
-
-        # Converting the timeseries figure to json and attaching it to the main microservice object:
-        log_freq_timeseries = json.dumps(log_level_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
+    # Converting the timeseries figure to json, the logs themselves are paged in by the template:
+    log_freq_timeseries = json.dumps(log_level_fig, cls=plotly.utils.PlotlyJSONEncoder)
 
-    return render_template("daily_microservice_dashboard.html", microservice=microservice, date=date, microservice_timeseries=log_freq_timeseries,  microservice_logs=microservice_logs)
\ No newline at end of file
+    return render_template("daily_microservice_dashboard.html", microservice=microservice, date=date, microservice_timeseries=log_freq_timeseries)
\ No newline at end of file
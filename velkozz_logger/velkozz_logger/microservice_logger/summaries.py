@@ -0,0 +1,179 @@
+# Importing native python modules:
+import json
+import time
+import logging
+import datetime
+import threading
+
+# Importing SQLAlchemy modules:
+from sqlalchemy import text
+
+# Importing internal packages:
+from .models import MicroserviceHeartbeat, MicroserviceSummary, db
+from .log_storage import log_storage
+from .upserts import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Key of the postgres advisory lock held while the summaries are refreshed:
+SUMMARY_REFRESH_LOCK_KEY = 0x76656c6b
+
+# The summary level each raw log level is counted under:
+SUMMARY_LEVELS = {
+    "INFO": "INFO",
+    "WARN": "WARNING",
+    "WARNING": "WARNING",
+    "ERR.": "ERROR",
+    "ERROR": "ERROR",
+    "CRITICAL": "CRITICAL"
+}
+
+def acquire_summary_refresh_lock():
+    """Method that takes the transaction scoped advisory lock serializing the summary refreshes,
+    returning False if another process holds it. Only postgres has advisory locks, on other
+    databases the refreshes are not serialized.
+    """
+    if db.engine.dialect.name != "postgresql":
+        return True
+
+    return db.session.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SUMMARY_REFRESH_LOCK_KEY}).scalar()
+
+def refresh_microservice_summaries(days=7, max_age_seconds=None):
+    """Method that rebuilds the 'microservice-summaries' table from the log table.
+
+    The daily counts per app_name and level for the last 'days' days are computed with a
+    single aggregate query, so the cost of a refresh does not depend on how often the
+    home page is requested. The last seen timestamp of each summary is read from the
+    heartbeat index.
+
+    The refresh holds an advisory lock and upserts the summaries, so several workers can
+    refresh at once w/o conflicting. Returns False if the refresh was skipped because another
+    process holds the lock, or because the summaries were refreshed less than 'max_age_seconds' ago.
+    """
+    now = datetime.datetime.now()
+
+    if not acquire_summary_refresh_lock():
+        db.session.rollback()
+        return False
+
+    if max_age_seconds is not None:
+        last_refresh = db.session.query(db.func.max(MicroserviceSummary.refreshed_at)).scalar()
+        if last_refresh is not None and (now - last_refresh).total_seconds() < max_age_seconds:
+            db.session.rollback()
+            return False
+
+    first_day = (now - datetime.timedelta(days=days - 1)).date()
+    dates = [first_day + datetime.timedelta(days=day) for day in range(days)]
+    date_index = {date: index for index, date in enumerate(dates)}
+
+    # Aggregating the daily log counts of every app_name and level in the database:
+    MicroServiceLog = log_storage.all_logs()
+    log_date = db.func.date(MicroServiceLog.created).label("log_date")
+    daily_counts = db.session.query(
+        MicroServiceLog.app_name,
+        MicroServiceLog.levelname,
+        log_date,
+        db.func.sum(db.func.coalesce(MicroServiceLog.occurrences, 1))).filter(
+            MicroServiceLog.created >= datetime.datetime.combine(first_day, datetime.time.min)).group_by(
+            MicroServiceLog.app_name, MicroServiceLog.levelname, log_date).all()
+
+    counts = {}
+    for app_name, levelname, date, count in daily_counts:
+        level = SUMMARY_LEVELS.get(levelname)
+        if app_name is None or level is None:
+            continue
+        # Sqlite returns dates as strings:
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date)
+        if date not in date_index:
+            continue
+
+        if app_name not in counts:
+            counts[app_name] = {summary_level: [0] * days for summary_level in set(SUMMARY_LEVELS.values())}
+        counts[app_name][level][date_index[date]] += int(count)
+
+    last_seen = {
+        heartbeat.app_name: heartbeat.last_seen
+        for heartbeat in MicroserviceHeartbeat.query.filter_by(levelname="*").all()
+    }
+
+    # Upserting the summary of every app_name that has logged in the period:
+    summaries = []
+    for app_name, app_counts in counts.items():
+        totals = {level: sum(level_counts) for level, level_counts in app_counts.items()}
+        total = sum(totals.values())
+
+        summaries.append({
+            "app_name": app_name,
+            "info_count": totals["INFO"],
+            "warning_count": totals["WARNING"],
+            "error_count": totals["ERROR"],
+            "critical_count": totals["CRITICAL"],
+            "error_ratio": (totals["ERROR"] + totals["CRITICAL"]) / total if total else 0.0,
+            "last_seen": last_seen.get(app_name),
+            "daily_counts": json.dumps(dict(app_counts, dates=[date.isoformat() for date in dates])),
+            "refreshed_at": now
+        })
+
+    if summaries:
+        statement = dialect_insert(MicroserviceSummary.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["app_name"],
+            set_={column: statement.excluded[column] for column in summaries[0] if column != "app_name"}
+        )
+        db.session.execute(statement, sorted(summaries, key=lambda summary: summary["app_name"]))
+
+    # Summaries of app_names that have not logged in the period are removed:
+    MicroserviceSummary.query.filter(
+        MicroserviceSummary.app_name.notin_(list(counts))).delete(synchronize_session=False)
+
+    db.session.commit()
+    return True
+
+class SummaryRefresher(object):
+    """The background refresh of the microservice summaries.
+
+    The first home page request of each worker starts a daemon thread that refreshes the
+    summaries every 'SUMMARY_REFRESH_SECONDS', so the page itself only reads the stored rows.
+    A refresh is skipped if another worker refreshed within the interval, so the week of logs
+    is aggregated about once per interval for the whole deployment. With
+    'SUMMARY_REFRESH_IN_BACKGROUND' disabled the summaries are only refreshed by the
+    'refresh-summaries' command, eg: from cron.
+    """
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.refresh_seconds = 300
+        self.background = True
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        "Method that configures the refresh schedule from the flask app config"
+        self.refresh_seconds = app.config.get("SUMMARY_REFRESH_SECONDS", self.refresh_seconds)
+        self.background = app.config.get("SUMMARY_REFRESH_IN_BACKGROUND", self.background)
+
+    def start(self, app):
+        "Method that starts the background refresh thread of this worker if it is not running"
+        if not self.background or self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.run, args=(app,), name="velkozz_summary_refresher", daemon=True)
+                self._thread.start()
+
+    def run(self, app):
+        while True:
+            try:
+                with app.app_context():
+                    refresh_microservice_summaries(max_age_seconds=self.refresh_seconds)
+            except Exception:
+                logger.exception("Error refreshing the microservice summaries")
+            time.sleep(self.refresh_seconds)
+
+# Summary refresh schedule shared by all requests within the worker process:
+summary_refresher = SummaryRefresher()
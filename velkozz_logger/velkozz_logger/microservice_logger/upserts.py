@@ -0,0 +1,76 @@
+# Importing native python modules:
+import logging
+
+# Importing SQLAlchemy modules:
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError, DataError, IntegrityError, StatementError
+
+# Importing internal packages:
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+
+def dialect_insert(table):
+    """Method that returns an insert statement of 'table' that supports on_conflict_do_update().
+
+    Postgres and sqlite both support INSERT ... ON CONFLICT, which lets several workers write
+    the same row at once without the select-then-insert race of going through the ORM.
+    """
+    if db.engine.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+def greatest(*values):
+    "Method that returns the SQL maximum of 'values', GREATEST() on postgres and the scalar MAX() on sqlite"
+    if db.engine.dialect.name == "sqlite":
+        return db.func.max(*values)
+    return db.func.greatest(*values)
+
+def is_rejected_row_error(error):
+    """Method that checks if an error was raised by rows the database or driver rejects (eg: a
+    value too long for its column, or of the wrong type), which would fail the same way on every retry.
+    """
+    if isinstance(error, (DataError, IntegrityError, TypeError, ValueError)):
+        return True
+
+    # The values that can't be bound to the statement are raised as a StatementError w/o a DBAPI error:
+    return isinstance(error, StatementError) and not isinstance(error, DBAPIError)
+
+def upsert_rows(statement, rows, key_columns):
+    """Method that executes and commits an upsert of 'rows', returning the rows that should be retried.
+
+    The rows are written in key order so concurrent flushes lock them in the same order. If
+    the database rejects the batch (eg: a value too long for its column) the rows are written
+    one at a time and the rejected ones are logged and dropped, so a bad row never blocks the
+    others. The rows that fail for any other reason (eg: the database is unreachable) are
+    logged and returned to be retried on the next flush.
+    """
+    rows = sorted(rows, key=lambda row: [str(row[key_column]) for key_column in key_columns])
+    try:
+        db.session.execute(statement, rows)
+        db.session.commit()
+        return []
+    except Exception as error:
+        db.session.rollback()
+        if not is_rejected_row_error(error):
+            logger.exception("Error upserting %s rows into %s", len(rows), statement.table.name)
+            return rows
+
+    retry_rows = []
+    for row in rows:
+        try:
+            db.session.execute(statement, [row])
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            if is_rejected_row_error(error):
+                logger.error("Dropped a row rejected by %s: %s: %s", statement.table.name, row, error)
+            else:
+                retry_rows.append(row)
+
+    if retry_rows:
+        logger.error("Error upserting %s rows into %s, retrying them on the next flush",
+            len(retry_rows), statement.table.name)
+
+    return retry_rows
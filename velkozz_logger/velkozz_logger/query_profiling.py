@@ -0,0 +1,148 @@
+# Importing native python modules:
+import time
+import threading
+import collections
+
+# Importing Flask and SQLAlchemy modules:
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+class QueryProfiler(object):
+    """The opt-in profiler of the SQL statements run by the application.
+
+    When 'QUERY_PROFILING' is enabled the profiler attaches cursor execution event hooks to
+    the database engine that time every statement and record its row count against the
+    request that ran it. Statement stats are aggregated across requests so the slowest
+    statements can be listed in the debug view. SELECT statements slower than
+    'QUERY_PROFILING_SLOW_MS' on postgres have their EXPLAIN (ANALYZE, BUFFERS) plan captured
+    once per 'QUERY_PROFILING_EXPLAIN_SECONDS'.
+
+    When profiling is disabled no hooks are attached, so there is no overhead at all.
+    """
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.slow_ms = 200
+        self.explain = True
+        self.explain_seconds = 600
+        self.max_statements = 1000
+
+        # Aggregated stats per statement and a summary of recently profiled requests:
+        self.statements = {}
+        self.requests = collections.deque(maxlen=100)
+
+        if app is not None and db is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        "Method that attaches the profiling hooks to the database engine if profiling is enabled"
+        self.enabled = app.config.get("QUERY_PROFILING", False)
+        if not self.enabled:
+            return
+
+        self.slow_ms = app.config.get("QUERY_PROFILING_SLOW_MS", self.slow_ms)
+        self.explain = app.config.get("QUERY_PROFILING_EXPLAIN", self.explain)
+        self.explain_seconds = app.config.get("QUERY_PROFILING_EXPLAIN_SECONDS", self.explain_seconds)
+
+        with app.app_context():
+            engine = db.engine
+
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+        event.listen(engine, "handle_error", self.handle_error)
+        app.teardown_request(self.teardown_request)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_profiling_start", []).append(time.perf_counter())
+
+    def handle_error(self, exception_context):
+        "Dropping the start time of a failed statement, as after_cursor_execute() is never called for it"
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_profiling_start"):
+            connection.info["query_profiling_start"].pop()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["query_profiling_start"].pop()) * 1000
+        rowcount = cursor.rowcount
+        endpoint = request.endpoint if has_request_context() else "<no request>"
+
+        # Recording the statement against the current request:
+        if has_request_context():
+            if "query_profile" not in g:
+                g.query_profile = []
+            g.query_profile.append((statement, duration_ms, rowcount))
+
+        with self._lock:
+            stats = self.statements.get(statement)
+            if stats is None:
+                # Evicting the statement w/ the lowest total time once the limit is reached:
+                if len(self.statements) >= self.max_statements:
+                    del self.statements[min(self.statements, key=lambda key: self.statements[key]["total_ms"])]
+                stats = self.statements[statement] = {
+                    "statement": statement, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "rows": 0, "endpoints": set(), "explain": None, "explained_at": None
+                }
+
+            stats["calls"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["rows"] += max(rowcount, 0)
+            stats["endpoints"].add(endpoint)
+
+            capture_explain = (
+                self.explain and duration_ms >= self.slow_ms and not executemany and
+                conn.dialect.name == "postgresql" and statement.lstrip().upper().startswith("SELECT") and
+                (stats["explained_at"] is None or time.time() - stats["explained_at"] > self.explain_seconds)
+            )
+            if capture_explain:
+                stats["explained_at"] = time.time()
+
+        if capture_explain:
+            plan = self.explain_statement(cursor, statement, parameters)
+            with self._lock:
+                stats["explain"] = plan
+
+    def explain_statement(self, cursor, statement, parameters):
+        """Method that captures the EXPLAIN (ANALYZE, BUFFERS) plan of a statement.
+
+        The plan is run on a new cursor of the same connection within a savepoint, so a
+        failure does not abort the transaction of the request.
+        """
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute("SAVEPOINT query_profiling_explain")
+            try:
+                explain_cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = "\n".join(row[0] for row in explain_cursor.fetchall())
+                explain_cursor.execute("RELEASE SAVEPOINT query_profiling_explain")
+            except Exception as error:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT query_profiling_explain")
+                plan = f"EXPLAIN failed: {error}"
+        finally:
+            explain_cursor.close()
+
+        return plan
+
+    def teardown_request(self, exception=None):
+        "Method that records the summary of the statements run by the finished request"
+        query_profile = g.pop("query_profile", None)
+        if not query_profile:
+            return
+
+        self.requests.appendleft({
+            "endpoint": request.endpoint,
+            "path": request.path,
+            "queries": len(query_profile),
+            "total_ms": sum(duration_ms for _, duration_ms, _ in query_profile),
+            "rows": sum(max(rowcount, 0) for _, _, rowcount in query_profile),
+            "slowest_ms": max(duration_ms for _, duration_ms, _ in query_profile)
+        })
+
+    def top_statements(self, limit=25):
+        "Method that returns the stats of the statements w/ the highest total time"
+        with self._lock:
+            statements = sorted(self.statements.values(), key=lambda stats: stats["total_ms"], reverse=True)[:limit]
+            return [dict(stats, endpoints=sorted(stats["endpoints"])) for stats in statements]
+
+# Query profiler shared by all requests within the worker process:
+query_profiler = QueryProfiler()